@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""Measure cft commands end to end against a stand-in Clockify server.
+
+Starts a fake Clockify API (see fake_server.py) serving a synthetic workspace,
+then runs cft commands against it, in order, starting with an empty cache:
+listing a year of time entries (with the cache empty and then with it warm),
+warming up the task cache, refreshing and reporting on the cache, and creating
+time entries. For each command the wall time, number of requests made to the
+server and peak memory use are reported. A settled month is then listed twice
+with a cache too small for every project and task, to check that evicting them
+doesn't lose mirrored time entries.
+
+Fails if a command fails, makes more requests than it should need to or lists
+different time entries, so regressions show up in CI.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import fake_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from clockifytool import ratelimit  # noqa: E402
+
+CFT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, "bin", "cft")
+
+# cft's "pool size" setting, which decides how missing projects are fetched
+POOL_SIZE = 10
+
+
+def list_budgets(workspace, start, end, page_size):
+    # Return the requests needed to list time entries with the cache empty, and
+    # with it warm. Listing fetches pages until one isn't full and, with the
+    # cache empty, the user's profile, each task and either each project or, if
+    # there are more than the pool size, the project catalogue
+    entries = workspace.entries_between(
+        "{}T00:00:00Z".format(start), "{}T00:00:00Z".format(end)
+    )
+    pages = len(entries) // page_size + 1
+    project_ids = set(entry["projectId"] for entry in entries)
+    task_ids = set(entry["taskId"] for entry in entries if entry["taskId"])
+
+    project_requests = len(project_ids)
+
+    if project_requests > POOL_SIZE:
+        project_requests = len(workspace.projects) // page_size + 1
+
+    return pages + 1 + project_requests + len(task_ids), pages
+
+
+def scenarios(workspace, page_size):
+    """Return name, cft arguments and request budget of each command to run."""
+    end = date.today()
+    start = end - timedelta(days=365)
+    period = ["-s", start.isoformat(), "-e", end.isoformat()]
+    cold_budget, warm_budget = list_budgets(
+        workspace, start, end + timedelta(days=1), page_size
+    )
+
+    project = workspace.projects[0]
+    task = workspace.tasks[workspace.projects[-1]["id"]][-1]
+    new = ["-t", "1", "-c", "Benchmark", "-d", end.isoformat()]
+
+    # Budgets are None where the number of requests depends on cft's settings
+    return [
+        ("list a year (cold cache)", ["list"] + period, cold_budget),
+        ("list a year (warm cache)", ["list"] + period, warm_budget),
+        ("cache warm", ["cache", "warm"], None),
+        ("cache refresh", ["cache", "refresh"], None),
+        ("cache status", ["cache"], 0),
+        ("new (project ID)", ["new", project["id"]] + new, 1),
+        ("new (task ID)", ["new", task["id"]] + new, 1),
+    ]
+
+
+def write_config(home, server, args, extra=""):
+    with open(os.path.join(home, ".cft.yml"), "w") as config_file:
+        config_file.write(
+            "api key: benchmark\n"
+            "workspace: {}\n"
+            "api url: {}\n"
+            "pool size: {}\n"
+            "rate limit: {}\n"
+            "page size: {}\n"
+            "{}".format(
+                server.workspace.id,
+                server.url,
+                POOL_SIZE,
+                args.client_rate_limit,
+                args.page_size,
+                extra,
+            )
+        )
+
+
+def run_command(argv, env, output):
+    # Return exit status, wall time, peak resident memory, in bytes, and errors
+    # of a cft command, writing its output to a file
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, CFT] + argv, env=env, stdout=output, stderr=subprocess.PIPE
+    )
+
+    # Drain stderr so the command can't block writing to it
+    errors = process.stderr.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - started
+
+    if os.WIFEXITED(status):
+        process.returncode = os.WEXITSTATUS(status)
+    else:
+        process.returncode = -os.WTERMSIG(status)
+    process.stderr.close()
+
+    # Linux reports kilobytes, macOS bytes
+    peak_memory = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    return process.returncode, wall_time, peak_memory, errors.decode("utf-8")
+
+
+def run_scenario(server, name, argv, budget, env, expected_lines=None):
+    # Run a cft command, printing, and returning, how it went
+    server.reset_counts()
+
+    with tempfile.TemporaryFile("w+") as output:
+        status, wall_time, peak_memory, errors = run_command(argv, env, output)
+        output.seek(0)
+        lines = len(output.readlines())
+
+    requests = server.request_count()
+
+    result = {
+        "name": name,
+        "command": " ".join(["cft"] + argv),
+        "status": status,
+        "wall_time": wall_time,
+        "requests": requests,
+        "rate_limited": server.counts.get("rate limited", 0),
+        "endpoints": dict(server.counts),
+        "peak_memory": peak_memory,
+        "lines": lines,
+        "problems": [],
+    }
+
+    if status:
+        result["problems"].append("exited with status {}".format(status))
+
+    if budget is not None and requests > budget:
+        result["problems"].append("more than {} requests".format(budget))
+
+    if expected_lines is not None and lines != expected_lines:
+        result["problems"].append(
+            "{} lines of output, not {}".format(lines, expected_lines)
+        )
+
+    problems = result["problems"]
+
+    print(
+        "{:<26} {:>8.2f}s {:>6} requests ({} rate limited) {:>7.1f}MB "
+        "{}".format(
+            name,
+            wall_time,
+            requests,
+            result["rate_limited"],
+            peak_memory / 1024 / 1024,
+            "FAIL ({})".format(", ".join(problems)) if problems else "ok",
+        )
+    )
+
+    if status:
+        sys.stdout.write(errors)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    fake_server.add_workspace_arguments(parser)
+    parser.add_argument(
+        "--client-rate-limit",
+        type=float,
+        default=ratelimit.DEFAULT_RATE,
+        help="cft's \"rate limit\" setting (default: cft's, %(default)g)",
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=200, help='cft\'s "page size" setting'
+    )
+    parser.add_argument("--json", metavar="file", help="also write results to a file")
+    args = parser.parse_args()
+
+    server = fake_server.create_server(args)
+    server.start()
+
+    print(
+        "{} projects, {} tasks each, {} time entries, {}ms latency".format(
+            len(server.workspace.projects),
+            args.tasks,
+            len(server.workspace.entries),
+            args.latency * 1000,
+        )
+    )
+
+    results = []
+    failed = False
+
+    with tempfile.TemporaryDirectory() as home:
+        write_config(home, server, args)
+
+        # An empty cache, and no daemon, to start with
+        env = dict(os.environ, HOME=home, TMPDIR=home)
+
+        for name, argv, budget in scenarios(server.workspace, args.page_size):
+            result = run_scenario(server, name, argv, budget, env)
+            results.append(result)
+            failed = failed or bool(result["problems"])
+
+    # Evicting projects and tasks from a small cache mustn't lose mirrored time
+    # entries, or the record of which days are synced, so listing a settled
+    # month again should list the same time entries
+    end = date.today() - timedelta(days=30)
+    period = ["-s", (end - timedelta(days=30)).isoformat(), "-e", end.isoformat()]
+    argv = ["list", "--format", "ndjson"] + period
+
+    with tempfile.TemporaryDirectory() as home:
+        write_config(home, server, args, "cache:\n  backend: files\n  max size: 40\n")
+        env = dict(os.environ, HOME=home, TMPDIR=home)
+
+        listed = run_scenario(server, "list a month (small cache)", argv, None, env)
+        relisted = run_scenario(
+            server, "list a month (mirrored)", argv, None, env, listed["lines"]
+        )
+
+        results += [listed, relisted]
+        failed = failed or bool(listed["problems"] or relisted["problems"])
+
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""Serve a synthetic Clockify workspace for benchmarking cft locally.
+
+The workspace has a configurable number of projects, each with tasks, and years
+of time entries (several each weekday). Responses can be delayed to simulate
+network latency and, if a rate limit is given, requests made too quickly are
+refused with 429 responses, as Clockify does. Requests are counted by endpoint.
+
+Only the parts of Clockify's API that cft uses are served. Point cft at the
+server by setting "api url" in its configuration file:
+
+    api url: http://127.0.0.1:8000/api/v1/
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BASE_PATH = "/api/v1/"
+
+
+def object_id(created, number):
+    # Clockify IDs are MongoDB object IDs, starting with a creation timestamp
+    return "{:08x}{:016x}".format(int(created.timestamp()), number)
+
+
+def parse_timestamp(timestamp):
+    return datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+def format_timestamp(timestamp):
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class Workspace(object):
+    """Synthetic projects, tasks and time entries of a single user."""
+
+    def __init__(
+        self,
+        projects=2000,
+        tasks=5,
+        years=3,
+        entries_per_day=4,
+        end=None,
+        seed=0,
+    ):
+        rng = random.Random(seed)
+        created = datetime(2015, 1, 1)
+
+        self.id = object_id(created, 1)
+        self.user = {
+            "id": object_id(created, 2),
+            "name": "Benchmark User",
+            "email": "benchmark@example.com",
+            "activeWorkspace": self.id,
+            "defaultWorkspace": self.id,
+            "settings": {"timeZone": "UTC"},
+        }
+        self.workspaces = [{"id": self.id, "name": "Benchmark Workspace"}]
+
+        self.projects = []
+        self.tasks = {}
+        self.next_number = 1000
+
+        for project_number in range(projects):
+            project_id = self.new_id(created)
+            self.projects.append(
+                {
+                    "id": project_id,
+                    "name": "Project {}".format(project_number + 1),
+                    "clientName": "Client {}".format(project_number % 50 + 1),
+                    "workspaceId": self.id,
+                    "billable": project_number % 3 == 0,
+                    "archived": False,
+                }
+            )
+            self.tasks[project_id] = [
+                {
+                    "id": self.new_id(created),
+                    "name": "Task {}".format(task_number + 1),
+                    "projectId": project_id,
+                    "status": "ACTIVE",
+                }
+                for task_number in range(tasks)
+            ]
+
+        self.projects_by_id = {project["id"]: project for project in self.projects}
+
+        # Time entries are kept newest first, as Clockify lists them
+        end = end or date.today()
+        day = end - timedelta(days=365 * years)
+        self.entries = []
+
+        while day < end:
+            if day.weekday() < 5:
+                for number in range(entries_per_day):
+                    start = datetime(day.year, day.month, day.day, 8 + 2 * number)
+                    project = rng.choice(self.projects)
+                    tasks = self.tasks[project["id"]]
+                    task = rng.choice(tasks) if tasks and rng.random() < 0.5 else None
+
+                    self.entries.append(
+                        self.new_entry(
+                            start,
+                            start + timedelta(hours=2),
+                            "Synthetic work {}".format(number + 1),
+                            project["id"],
+                            task["id"] if task else None,
+                            project["billable"],
+                        )
+                    )
+
+            day += timedelta(days=1)
+
+        self.entries.reverse()
+        self.entries_by_id = {entry["id"]: entry for entry in self.entries}
+        self.lock = threading.Lock()
+
+    def new_id(self, created):
+        self.next_number += 1
+        return object_id(created, self.next_number)
+
+    def new_entry(self, start, end, description, project_id, task_id, billable):
+        hours, minutes = divmod(int((end - start).total_seconds()) // 60, 60)
+        duration = "PT"
+
+        if hours:
+            duration += "{}H".format(hours)
+
+        if minutes or not hours:
+            duration += "{}M".format(minutes)
+
+        return {
+            "id": self.new_id(start),
+            "description": description,
+            "projectId": project_id,
+            "taskId": task_id,
+            "userId": self.user["id"],
+            "workspaceId": self.id,
+            "billable": billable,
+            "tagIds": None,
+            "timeInterval": {
+                "start": format_timestamp(start),
+                "end": format_timestamp(end),
+                "duration": duration,
+            },
+        }
+
+    def entries_between(self, start=None, end=None):
+        # Compare timestamps formatted alike
+        if start is not None:
+            start = format_timestamp(parse_timestamp(start))
+
+        if end is not None:
+            end = format_timestamp(parse_timestamp(end))
+
+        with self.lock:
+            return [
+                entry
+                for entry in self.entries
+                if (start is None or entry["timeInterval"]["start"] >= start)
+                and (end is None or entry["timeInterval"]["start"] <= end)
+            ]
+
+    def add_entry(self, data):
+        entry = self.new_entry(
+            parse_timestamp(data["start"]),
+            parse_timestamp(data["end"]),
+            data.get("description", ""),
+            data.get("projectId"),
+            data.get("taskId"),
+            bool(data.get("billable")),
+        )
+
+        with self.lock:
+            self.entries.append(entry)
+            self.entries.sort(
+                key=lambda entry: entry["timeInterval"]["start"], reverse=True
+            )
+            self.entries_by_id[entry["id"]] = entry
+
+        return entry
+
+    def remove_entry(self, entry_id):
+        with self.lock:
+            entry = self.entries_by_id.pop(entry_id, None)
+
+            if entry is not None:
+                self.entries.remove(entry)
+
+        return entry
+
+
+class RateLimiter(object):
+    """Allow a number of requests per second, in bursts of up to that number."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait_time(self):
+        # Take a token, returning 0, or return how long until one's available
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+
+class FakeClockifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, workspace, address=("127.0.0.1", 0), latency=0, rate_limit=0):
+        ThreadingHTTPServer.__init__(self, address, RequestHandler)
+
+        self.workspace = workspace
+        self.latency = latency
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.lock = threading.Lock()
+        self.reset_counts()
+
+    @property
+    def url(self):
+        return "http://{}:{}{}".format(
+            self.server_address[0], self.server_address[1], BASE_PATH
+        )
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts = {}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def request_count(self):
+        with self.lock:
+            return sum(
+                count for name, count in self.counts.items() if name != "rate limited"
+            )
+
+    def start(self):
+        """Serve requests in a background thread."""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Routes, by method, of paths relative to the base path
+    ROUTES = [
+        ("GET", r"user", "user"),
+        ("GET", r"workspaces", "workspaces"),
+        ("GET", r"workspaces/(\w+)/projects", "projects"),
+        ("GET", r"workspaces/(\w+)/projects/(\w+)", "project"),
+        ("GET", r"workspaces/(\w+)/projects/(\w+)/tasks", "project_tasks"),
+        ("GET", r"workspaces/(\w+)/projects/(\w+)/tasks/(\w+)", "task"),
+        ("GET", r"workspaces/(\w+)/user/(\w+)/time-entries", "user_entries"),
+        ("GET", r"workspaces/(\w+)/time-entries/(\w+)", "entry"),
+        ("POST", r"workspaces/(\w+)/time-entries", "create_entry"),
+        ("PUT", r"workspaces/(\w+)/time-entries/(\w+)", "update_entry"),
+        ("DELETE", r"workspaces/(\w+)/time-entries/(\w+)", "delete_entry"),
+    ]
+
+    def log_message(self, message_format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        path = url.path[len(BASE_PATH) :].strip("/")
+        self.query = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if self.server.rate_limiter is not None:
+            wait_time = self.server.rate_limiter.wait_time()
+
+            if wait_time:
+                self.server.count("rate limited")
+                return self.respond(
+                    429,
+                    {"message": "Too many requests", "code": 429},
+                    {"Retry-After": "{:.2f}".format(wait_time)},
+                )
+
+        if not url.path.startswith(BASE_PATH):
+            return self.not_found()
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.match(pattern + "$", path)
+
+            if route_method == method and match:
+                self.server.count("{} {}".format(method, name))
+                workspace_id = match.groups()[0] if match.groups() else None
+
+                if workspace_id and workspace_id != self.server.workspace.id:
+                    return self.not_found()
+
+                data = json.loads(body) if body else None
+
+                return getattr(self, name)(data, *match.groups()[1:])
+
+        self.server.count("{} unknown".format(method))
+        self.not_found()
+
+    def respond(self, status, data=None, headers=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+
+        if data is not None:
+            self.send_header("Content-Type", "application/json")
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_found(self):
+        self.respond(404, {"message": "Not found", "code": 404})
+
+    def page(self, items):
+        page_number = int(self.query.get("page", 1))
+        page_size = int(self.query.get("page-size", 50))
+        start = (page_number - 1) * page_size
+
+        self.respond(200, items[start : start + page_size])
+
+    def user(self, data):
+        self.respond(200, self.server.workspace.user)
+
+    def workspaces(self, data):
+        self.respond(200, self.server.workspace.workspaces)
+
+    def projects(self, data):
+        self.page(self.server.workspace.projects)
+
+    def project(self, data, project_id):
+        project = self.server.workspace.projects_by_id.get(project_id)
+
+        if project is None:
+            return self.not_found()
+
+        self.respond(200, project)
+
+    def project_tasks(self, data, project_id):
+        if project_id not in self.server.workspace.tasks:
+            return self.not_found()
+
+        self.page(self.server.workspace.tasks[project_id])
+
+    def task(self, data, project_id, task_id):
+        for task in self.server.workspace.tasks.get(project_id, []):
+            if task["id"] == task_id:
+                return self.respond(200, task)
+
+        self.not_found()
+
+    def user_entries(self, data, user_id):
+        self.page(
+            self.server.workspace.entries_between(
+                self.query.get("start"), self.query.get("end")
+            )
+        )
+
+    def entry(self, data, entry_id):
+        entry = self.server.workspace.entries_by_id.get(entry_id)
+
+        if entry is None:
+            return self.not_found()
+
+        self.respond(200, entry)
+
+    def create_entry(self, data):
+        if not data or "start" not in data or "end" not in data:
+            return self.respond(400, {"message": "Invalid time entry", "code": 400})
+
+        self.respond(201, self.server.workspace.add_entry(data))
+
+    def update_entry(self, data, entry_id):
+        entry = self.server.workspace.entries_by_id.get(entry_id)
+
+        if entry is None:
+            return self.not_found()
+
+        entry.update(
+            {
+                "description": data.get("description", entry["description"]),
+                "projectId": data.get("projectId", entry["projectId"]),
+                "taskId": data.get("taskId", entry["taskId"]),
+            }
+        )
+
+        self.respond(200, entry)
+
+    def delete_entry(self, data, entry_id):
+        if self.server.workspace.remove_entry(entry_id) is None:
+            return self.not_found()
+
+        self.respond(204)
+
+
+def add_workspace_arguments(parser):
+    parser.add_argument("--projects", type=int, default=2000, help="number of projects")
+    parser.add_argument(
+        "--tasks", type=int, default=5, help="number of tasks of each project"
+    )
+    parser.add_argument(
+        "--years", type=int, default=3, help="years of time entries, up to today"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.02,
+        help="seconds to delay each response by (default: 0.02)",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0,
+        help="requests per second allowed before responding with 429 (default: "
+        "no limit)",
+    )
+
+
+def create_server(args, address=("127.0.0.1", 0)):
+    workspace = Workspace(args.projects, args.tasks, args.years)
+
+    return FakeClockifyServer(workspace, address, args.latency, args.rate_limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    add_workspace_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_server(args, ("127.0.0.1", args.port))
+
+    print(
+        "Serving {} projects and {} time entries at {}".format(
+            len(server.workspace.projects), len(server.workspace.entries), server.url
+        )
+    )
+    print("Workspace ID: {}".format(server.workspace.id))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Check that cft commands start quickly.
+
+Runs commands with "python -X importtime" and fails if a command imports a
+module it shouldn't need, or if importing clockifytool takes longer than the
+import time budget.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+CFT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, "bin", "cft")
+
+# Modules that are slow to import and that each command should avoid
+HEAVY_MODULES = [
+    "concurrent.futures",
+    "dateutil",
+    "isodate",
+    "pytz",
+    "requests",
+    "sqlite3",
+    "tzlocal",
+    "yaml",
+]
+
+# Commands, and the heavy modules they're allowed to import
+COMMANDS = [
+    (["version"], []),
+    (["--help"], []),
+    (["cache"], ["sqlite3"]),
+]
+
+
+def import_times(argv, env):
+    # Return cumulative import time, in microseconds, of each top-level module
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", CFT] + argv,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    ).stderr
+
+    times = {}
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, cumulative, module = line.split("|")
+
+        if cumulative.strip().isdigit():
+            module = module.strip()
+            times[module] = max(times.get(module, 0), int(cumulative))
+
+    return times
+
+
+def check_command(argv, allowed_modules, budget, env):
+    # Run once so bytecode gets cached, then measure
+    import_times(argv, env)
+    times = import_times(argv, env)
+
+    failures = []
+
+    for module in HEAVY_MODULES:
+        if module in times and module not in allowed_modules:
+            failures.append("imports {}".format(module))
+
+    app_time = times.get("clockifytool.app", 0) / 1000
+
+    if app_time > budget:
+        failures.append("clockifytool took {:.1f}ms to import".format(app_time))
+
+    status = "FAIL ({})".format(", ".join(failures)) if failures else "ok"
+    print("cft {}: {:.1f}ms {}".format(" ".join(argv), app_time, status))
+
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=50,
+        help="maximum milliseconds importing clockifytool may take (default: 50)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        with open(os.path.join(home, ".cft.yml"), "w") as config_file:
+            config_file.write("api key: benchmark\nworkspace: benchmark\n")
+
+        env = dict(os.environ, HOME=home, TMPDIR=home)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+        results = [
+            check_command(argv, allowed_modules, args.budget, env)
+            for argv, allowed_modules in COMMANDS
+        ]
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Compare parsing Clockify's timestamps and durations with the fast path.
+
+Parses the start times and durations of synthetic time entries using dateutil
+and isodate, as cft used to, and using Iso8601DateConverter, checking that both
+give the same results.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+from clockifytool import api  # noqa: E402
+
+
+def synthetic_entries(count):
+    # Entries start every 17 minutes and last between 15 minutes and 8 hours
+    first_start = datetime(2019, 7, 6, 8, 0, 0)
+    entries = []
+
+    for number in range(count):
+        start = first_start + timedelta(minutes=17 * number)
+        minutes = 15 * (1 + number % 32)
+        duration = "PT"
+
+        if minutes >= 60:
+            duration += "{}H".format(minutes // 60)
+
+        if minutes % 60:
+            duration += "{}M".format(minutes % 60)
+
+        entries.append(
+            {
+                "start": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "duration": duration,
+            }
+        )
+
+    return entries
+
+
+def parse_slowly(entries, tz):
+    import dateutil.parser
+    import isodate
+
+    results = []
+
+    for entry in entries:
+        local_start = dateutil.parser.parse(entry["start"]).astimezone(tz)
+        minutes = isodate.parse_duration(entry["duration"]).total_seconds() / 60
+        results.append((local_start, minutes / 60))
+
+    return results
+
+
+def parse_quickly(entries, converter):
+    results = []
+
+    for entry in entries:
+        local_start = converter.utc_iso_8601_string_to_local_datetime(entry["start"])
+        hours = converter.iso_duration_to_hours(entry["duration"])
+        results.append((local_start, hours))
+
+    return results
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    results = function(*args)
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n", "--entries", type=int, default=100000, help="number of time entries"
+    )
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.entries)
+    converter = api.Iso8601DateConverter()
+
+    # Import libraries, and look up the local timezone, before timing anything
+    slow_results, _ = timed(parse_slowly, entries[:1], converter.tz)
+    quick_results, _ = timed(parse_quickly, entries[:1], converter)
+    api.utc_timestamp_to_local_datetime.cache_clear()
+
+    slow_results, slow_time = timed(parse_slowly, entries, converter.tz)
+    quick_results, quick_time = timed(parse_quickly, entries, converter)
+
+    if slow_results != quick_results:
+        print("Results differ.")
+        return 1
+
+    print("{} time entries".format(len(entries)))
+    print("dateutil/isodate: {:.3f}s".format(slow_time))
+    print(
+        "fast path: {:.3f}s ({:.1f}x faster)".format(quick_time, slow_time / quick_time)
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,110 +1,260 @@
 import json
-import os
-import tempfile
-from datetime import datetime, timedelta
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
-import dateutil.parser
-import isodate
-import pytz
-import requests
-from tzlocal import get_localzone
+from clockifytool import cache, instrumentation, ratelimit
+
+# Third-party libraries (and some standard library modules) are imported where
+# they're used, rather than here, to keep startup fast for commands that don't
+# need them
+
+# HTTP statuses worth retrying: transient server errors (rate limited requests
+# are retried once the rate limiter allows)
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# HTTP status of requests refused due to rate limiting
+RATE_LIMITED = 429
+
+
+class ClockifyApiError(Exception):
+    """Error response, or unexpected response, from the Clockify API."""
+
+
+# Date/time and duration formats used by the Clockify API, which can be parsed
+# much faster than by dateutil/isodate
+UTC_TIMESTAMP = re.compile(
+    r"^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6})\d*)?(?:Z|\+00:00)$"
+)
+LOCAL_TIMESTAMP = re.compile(
+    r"^(\d{4})-(\d\d)-(\d\d)(?:[T ](\d\d):(\d\d)(?::(\d\d))?)?$"
+)
+DURATION = re.compile(r"^PT(?=\d)(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?$")
+
+
+def parse_utc_timestamp(timestamp):
+    # Parse a UTC date/time, as formatted by Clockify, falling back to dateutil
+    match = UTC_TIMESTAMP.match(timestamp)
+
+    if match is None:
+        import dateutil.parser
+
+        return dateutil.parser.parse(timestamp)
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    microsecond = int(fraction.ljust(6, "0")) if fraction else 0
+
+    return datetime(
+        int(year),
+        int(month),
+        int(day),
+        int(hour),
+        int(minute),
+        int(second),
+        microsecond,
+        tzinfo=timezone.utc,
+    )
+
+
+def parse_local_timestamp(timestamp):
+    # Parse a naive date, or date/time, falling back to dateutil for anything
+    # other than a plain ISO 8601 date and time
+    match = LOCAL_TIMESTAMP.match(timestamp)
+
+    if match is None:
+        import dateutil.parser
+
+        return dateutil.parser.parse(timestamp)
+
+    return datetime(*[int(part) for part in match.groups() if part is not None])
+
+
+@lru_cache(maxsize=65536)
+def utc_timestamp_to_local_datetime(timestamp, tz):
+    return parse_utc_timestamp(timestamp).astimezone(tz)
+
+
+@lru_cache(maxsize=1024)
+def duration_seconds(duration):
+    # Parse an ISO 8601 duration, as formatted by Clockify, falling back to isodate
+    match = DURATION.match(duration)
+
+    if match is None:
+        import isodate
+
+        return isodate.parse_duration(duration).total_seconds()
+
+    hours, minutes, seconds = match.groups()
+
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0)
 
 
 class Iso8601DateConverter(object):
     def __init__(self):
-        self.tz = get_localzone()
+        self.local_timezone = None
+
+    @property
+    def tz(self):
+        if self.local_timezone is None:
+            from tzlocal import get_localzone
+
+            self.local_timezone = get_localzone()
+
+        return self.local_timezone
 
     def add_hours_to_localized_datetime_and_convert_to_iso_8601(
         self, localized_datetime, hours
     ):
+        import isodate
+        import pytz
+
         new_localized_datetime = localized_datetime + timedelta(hours=float(hours))
         utc_datetime = new_localized_datetime.astimezone(pytz.utc)
         return isodate.datetime_isoformat(utc_datetime)
 
     def utc_iso_8601_string_to_local_datetime(self, utc_date_string):
-        return dateutil.parser.parse(utc_date_string).astimezone(self.tz)
+        return utc_timestamp_to_local_datetime(utc_date_string, self.tz)
 
     def utc_iso_8601_string_to_local_datatime_string(self, utc_date_string):
         local_datetime = self.utc_iso_8601_string_to_local_datetime(utc_date_string)
         return local_datetime.strftime("%Y-%m-%d %H:%M:%S")
 
     def iso_duration_to_hours(self, duration):
-        minutes = isodate.parse_duration(duration).total_seconds() / 60
+        minutes = duration_seconds(duration) / 60
         return minutes / 60
 
     def iso_duration_from_iso_8601_dates(self, start, end):
-        duration = dateutil.parser.parse(end) - dateutil.parser.parse(start)
+        import isodate
+
+        duration = parse_utc_timestamp(end) - parse_utc_timestamp(start)
         return isodate.duration_isoformat(duration)
 
     def local_date_string_to_utc_iso_8601(self, date_string):
+        import isodate
+        import pytz
+
         localized_date = self.local_date_string_to_localized_datetime(date_string)
         utc_datetime = localized_date.astimezone(pytz.utc)
         return isodate.datetime_isoformat(utc_datetime)
 
     def local_date_string_to_localized_datetime(self, date_string):
-        naive_date = dateutil.parser.parse(date_string)
+        naive_date = parse_local_timestamp(date_string)
         return self.tz.localize(naive_date)
 
 
 class ClockifyEntryCacheManager(Iso8601DateConverter):
-    def __init__(self):
+    def __init__(self, backend=None, ttls=None, max_size=cache.DEFAULT_MAX_SIZE):
         super(ClockifyEntryCacheManager, self).__init__()
 
-    def get_cache_directory(self):
-        cache_dir = os.path.join(tempfile.gettempdir(), "cft")
+        if backend is None or isinstance(backend, str):
+            backend = cache.create_backend(backend)
+
+        if ttls is None:
+            ttls = cache.DEFAULT_TTLS
+
+        self.backend = backend
+        self.ttls = ttls
+        self.max_size = max_size
+
+    @classmethod
+    def from_config(cls, cache_config):
+        return cls(
+            cache_config.get("backend"),
+            cache.ttls_from_config(cache_config),
+            cache_config.get("max size", cache.DEFAULT_MAX_SIZE),
+        )
 
-        if not os.path.isdir(cache_dir):
-            os.mkdir(cache_dir)
+    def get_cache_directory(self):
+        return cache.get_cache_directory()
 
-        return cache_dir
+    def kind(self, prefix=None):
+        if prefix is None:
+            return cache.DEFAULT_KIND
 
-    def get_cache_filepath(self, identifier, prefix=None):
-        if prefix is not None:
-            identifier = prefix + "-" + identifier
+        return prefix
 
-        return os.path.join(self.get_cache_directory(), "cft-{}".format(identifier))
+    def record(self, operation, kind, started, outcome=None, items=1):
+        if instrumentation.enabled:
+            instrumentation.metrics.add_cache_operation(
+                operation, kind, time.perf_counter() - started, outcome, items
+            )
 
     def create(self, data, identifier=None, prefix=None):
         if identifier is None:
             identifier = data["id"]
 
-        filepath = self.get_cache_filepath(identifier, prefix)
+        started = time.perf_counter()
+        self.backend.set(self.kind(prefix), identifier, data)
+        self.record("write", self.kind(prefix), started)
+        self.evict()
+
+    def create_many(self, items, prefix=None):
+        # Cache a batch of (identifier, data) pairs with as few writes as possible
+        items = list(items)
+
+        started = time.perf_counter()
+        self.backend.set_many(self.kind(prefix), items)
+        self.record("write", self.kind(prefix), started, items=len(items))
+        self.evict()
+
+    def evict(self):
+        # Drop least recently used projects and tasks beyond the maximum (time
+        # entries are kept as they make up the local mirror of time entries)
+        if self.max_size:
+            kinds = [kind for kind in sorted(self.ttls) if kind != cache.DEFAULT_KIND]
 
-        if os.path.isfile(filepath):
-            os.remove(filepath)
+            started = time.perf_counter()
+            self.backend.evict(kinds, self.max_size)
+            self.record("evict", "all", started)
 
-        with open(filepath, "w") as cache_file:
-            cache_file.write(json.dumps(data))
+    def expired(self, kind, updated):
+        ttl = self.ttls.get(kind)
+
+        return ttl is not None and time.time() - updated > ttl
 
     def create_from_entry(self, entry):
-        filepath = self.get_cache_filepath(entry["id"])
+        self.create(entry)
 
-        if os.path.isfile(filepath):
-            os.remove(filepath)
+    def delete(self, identifier, prefix=None):
+        started = time.perf_counter()
+        self.backend.delete(self.kind(prefix), identifier)
+        self.record("delete", self.kind(prefix), started)
 
-        with open(filepath, "w") as cache_file:
-            cache_file.write(json.dumps(entry))
+    def delete_many(self, identifiers, prefix=None):
+        identifiers = list(identifiers)
 
-    def create_from_new_entry_response(self, response_data):
-        cached_entry = response_data.copy()
+        started = time.perf_counter()
+        self.backend.delete_many(self.kind(prefix), identifiers)
+        self.record("delete", self.kind(prefix), started, items=len(identifiers))
 
-        cached_entry["project"] = {"id": cached_entry["projectId"]}
-        del cached_entry["projectId"]
+    def query(self, start_from, start_to, prefix=None):
+        # Return cached time entries that started, in UTC, within a range
+        started = time.perf_counter()
+        results = self.backend.query(self.kind(prefix), start_from[:19], start_to[:19])
+        self.record("query", self.kind(prefix), started, items=len(results))
 
-        if "taskId" in cached_entry:
-            cached_entry["task"] = {"id": cached_entry["taskId"]}
-        else:
-            cached_entry["task"] = None
-        del cached_entry["taskId"]
+        return results
+
+    def identifiers(self, prefix=None):
+        # Return the IDs of all unexpired cached objects of a kind
+        kind = self.kind(prefix)
+        updated_after = None
 
-        cached_entry["tags"] = None
-        del cached_entry["tagIds"]
+        if self.ttls.get(kind) is not None:
+            updated_after = time.time() - self.ttls[kind]
 
-        self.create_from_entry(cached_entry)
+        return self.backend.identifiers(kind, updated_after)
+
+    def counts(self):
+        return self.backend.counts()
+
+    def flush(self):
+        self.backend.flush()
 
     def generate_update_entry(self, entry_id, comments=None, date=None, hours=None):
-        # Need to use cached time entry data because API doesn't support getting time entry data by ID
-        cached_entry = self.get_cached_entry(entry_id)
+        # Use cached time entry data, rather than fetching it (see helpers.entries_by_id)
+        cached_entry = self.get_cached_entry(entry_id, allow_stale=True)
 
         if not cached_entry:
             return
@@ -115,13 +265,24 @@ class ClockifyEntryCacheManager(Iso8601DateConverter):
         updated_entry["description"] = cached_entry["description"]
         updated_entry["start"] = cached_entry["timeInterval"]["start"]
         updated_entry["end"] = cached_entry["timeInterval"]["end"]
-        updated_entry["projectId"] = cached_entry["project"]["id"]
         updated_entry["billable"] = cached_entry["billable"]
         updated_entry["tagIds"] = []
 
+        # Entries cached from listings, rather than creation, use API field names
+        if "projectId" in cached_entry:
+            updated_entry["projectId"] = cached_entry["projectId"]
+        else:
+            updated_entry["projectId"] = cached_entry["project"]["id"]
+
+        if cached_entry.get("taskId"):
+            updated_entry["taskId"] = cached_entry["taskId"]
+
         if "task" in cached_entry and cached_entry["task"]:
             updated_entry["taskId"] = cached_entry["task"]["id"]
 
+        if cached_entry.get("tagIds"):
+            updated_entry["tagIds"] = list(cached_entry["tagIds"])
+
         if "tags" in cached_entry and cached_entry["tags"]:
             for tag in cached_entry["tags"]:
                 updated_entry["tagIds"].append(tag["id"])
@@ -138,11 +299,14 @@ class ClockifyEntryCacheManager(Iso8601DateConverter):
             )
             original_date = original_date_localized.strftime("%Y-%m-%d")
 
+            # Keep the entry's local start time when moving it to another date
             if original_date != date:
-                updated_entry["start"] = self.local_date_string_to_utc_iso_8601(date)
+                updated_entry["start"] = self.local_date_string_to_utc_iso_8601(
+                    date + " " + original_date_localized.strftime("%H:%M:%S")
+                )
 
         # Convert UTC start/time to localized datetime and use it to calculate ISO 8601 end date/time
-        start_datetime = dateutil.parser.parse(updated_entry["start"])
+        start_datetime = parse_utc_timestamp(updated_entry["start"])
         updated_entry[
             "end"
         ] = self.add_hours_to_localized_datetime_and_convert_to_iso_8601(
@@ -151,19 +315,38 @@ class ClockifyEntryCacheManager(Iso8601DateConverter):
 
         return updated_entry
 
-    def get_cached_entry(self, identifier, prefix=None):
-        filepath = self.get_cache_filepath(identifier, prefix)
+    def get_cached_entry(self, identifier, prefix=None, allow_stale=False):
+        data, stale = self.lookup(identifier, prefix)
 
-        if not os.path.isfile(filepath):
+        if stale and not allow_stale:
             return
 
-        with open(filepath) as json_file:
-            return json.load(json_file)
+        return data
+
+    def lookup(self, identifier, prefix=None):
+        # Return cached data, if any, and whether it has expired
+        kind = self.kind(prefix)
+
+        started = time.perf_counter()
+        record = self.backend.get(kind, identifier)
+
+        if record is None:
+            self.record("read", kind, started, "miss")
+            return None, False
+
+        data, updated = record
+        expired = self.expired(kind, updated)
 
+        self.record("read", kind, started, "stale" if expired else "hit")
 
-class ClockifyApi(Iso8601DateConverter):
-    def __init__(self, apiKey, url=None):
-        super(ClockifyApi, self).__init__()
+        return data, expired
+
+
+class ClockifyEndpoints(Iso8601DateConverter):
+    """URLs, parameters and request data shared by the sync and async clients."""
+
+    def __init__(self, apiKey, url=None, page_size=200):
+        super(ClockifyEndpoints, self).__init__()
 
         if not url:
             url = "https://api.clockify.me/api/v1/"
@@ -171,35 +354,116 @@ class ClockifyApi(Iso8601DateConverter):
         self.url = url
         self.key = apiKey
         self.headers = {"Content-Type": "application/json", "X-Api-Key": self.key}
+        self.page_size = page_size
 
-        self.cache = ClockifyEntryCacheManager()
-
-    def post(self, url, data):
-        return requests.post(url, data=json.dumps(data), headers=self.headers)
+        self.current_user = None
 
     def set_workspace(self, workspace_id):
         self.workspace = workspace_id
 
-    def workspaces(self):
-        url = "{}workspaces/".format(self.url)
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+    def workspaces_url(self):
+        return "{}workspaces/".format(self.url)
 
-    def projects(self, limit=None):
-        url = "{}workspaces/{}/projects/".format(self.url, self.workspace)
+    def user_url(self):
+        return "{}user/".format(self.url)
+
+    def user_cache_key(self):
+        import hashlib
+
+        # The user's profile is cached by API key
+        return hashlib.sha256(self.key.encode("utf-8")).hexdigest()
+
+    def cached_user(self, refresh=False):
+        # The user's profile is memoized, and cached by API key, as it rarely changes
+        if refresh:
+            return
+
+        if self.current_user is None:
+            self.current_user = self.cache.get_cached_entry(
+                self.user_cache_key(), "user"
+            )
+
+        return self.current_user
+
+    def remember_user(self, user):
+        # Error responses, rather than profiles, are returned but not remembered
+        if "id" in user:
+            self.cache.create(user, self.user_cache_key(), "user")
+            self.current_user = user
+
+        return user
+
+    def remember_entries(self, entries):
+        # Index listed time entries in the cache so they can be found by ID, or
+        # by date, without asking Clockify again
+        self.cache.create_many([(entry["id"], entry) for entry in entries])
 
+    def projects_params(self, limit=None):
         params = {}
 
         if limit is not None:
             params["page-size"] = limit
 
-        response = requests.get(url, headers=self.headers, params=params)
-        return response.json()
+        return params
 
-    def user(self):
-        url = "{}user/".format(self.url)
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+    def projects_url(self):
+        return "{}workspaces/{}/projects/".format(self.url, self.workspace)
+
+    def project_url(self, project_id):
+        return "{}workspaces/{}/projects/{}/".format(
+            self.url, self.workspace, project_id
+        )
+
+    def project_tasks_url(self, project_id):
+        return "{}workspaces/{}/projects/{}/tasks/".format(
+            self.url, self.workspace, project_id
+        )
+
+    def task_url(self, project_id, task_id):
+        return "{}workspaces/{}/projects/{}/tasks/{}/".format(
+            self.url, self.workspace, project_id, task_id
+        )
+
+    def entries_url(self):
+        return "{}workspaces/{}/time-entries/".format(self.url, self.workspace)
+
+    def entry_url(self, entry_id):
+        return "{}workspaces/{}/time-entries/{}/".format(
+            self.url, self.workspace, entry_id
+        )
+
+    def user_entries_url(self, user_id):
+        return "{}workspaces/{}/user/{}/time-entries".format(
+            self.url, self.workspace, user_id
+        )
+
+    def entries_params(self, start=None, end=None):
+        params = {}
+
+        if start:
+            params["start"] = self.local_date_string_to_utc_iso_8601(start)
+        if end:
+            params["end"] = self.local_date_string_to_utc_iso_8601(end)
+
+        return params
+
+    def page_params(self, params=None, page_size=None):
+        params = dict(params or {})
+        params["page-size"] = page_size or self.page_size
+
+        return params
+
+    def page_results(self, response_data):
+        if not isinstance(response_data, list):
+            raise ClockifyApiError(
+                response_data.get("message", "Unexpected API response.")
+            )
+
+        return response_data
+
+    def last_page(self, page, params):
+        # The number of pages isn't known until a page isn't full
+        return len(page) < params["page-size"]
 
     def replace_datetime_time(self, date, time):
         time_data = time.split(":")
@@ -209,7 +473,7 @@ class ClockifyApi(Iso8601DateConverter):
 
         return date.replace(hour=hours, minute=minutes)
 
-    def create_entry(
+    def new_entry_data(
         self,
         project,
         description,
@@ -219,6 +483,10 @@ class ClockifyApi(Iso8601DateConverter):
         billable=False,
         task=None,
     ):
+        # Return the request data used to create a time entry
+        import isodate
+        import pytz
+
         if not date:
             local_datetime = datetime.now()
 
@@ -241,7 +509,7 @@ class ClockifyApi(Iso8601DateConverter):
                 localized_datetime, hours
             )
 
-        data = {
+        return {
             "start": start_date,
             "end": end_date,
             "billable": billable,
@@ -251,61 +519,260 @@ class ClockifyApi(Iso8601DateConverter):
             "tagIds": [],
         }
 
-        url = "{}workspaces/{}/time-entries/".format(self.url, self.workspace)
-        response = self.post(url, data)
 
-        # Cache entry if entry was created
+class ClockifyApi(ClockifyEndpoints):
+    def __init__(
+        self,
+        apiKey,
+        url=None,
+        pool_size=10,
+        retries=3,
+        backoff=0.5,
+        timeout=30,
+        cache=None,
+        page_size=200,
+        rate_limit=ratelimit.DEFAULT_RATE,
+    ):
+        super(ClockifyApi, self).__init__(apiKey, url, page_size)
+
+        # Requests, by all threads, are paced to stay within Clockify's rate limit
+        self.rate_limiter = ratelimit.TokenBucket(rate_limit)
+
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.http_session = None
+
+        # Executor used to refresh stale cached data without waiting for it
+        self.background_executor = None
+
+        self.cache = cache
+
+        if self.cache is None:
+            self.cache = ClockifyEntryCacheManager()
+
+    @property
+    def session(self):
+        if self.http_session is None:
+            self.http_session = self.create_session()
+
+        return self.http_session
+
+    def create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        class ServerErrorRetry(Retry):
+            # Leave rate limited requests to the rate limiter (see request)
+            RETRY_AFTER_STATUS_CODES = Retry.RETRY_AFTER_STATUS_CODES - {RATE_LIMITED}
+
+        # Requests that hit transient server errors are retried with exponential
+        # backoff (honouring any Retry-After header). Non-idempotent requests,
+        # which may have been acted on, are never retried.
+        retry = ServerErrorRetry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        )
+
+        # Pooled, keep-alive connections are shared by all API calls
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def run_in_background(self, function, *args):
+        from concurrent.futures import ThreadPoolExecutor
+
+        if self.background_executor is None:
+            self.background_executor = ThreadPoolExecutor(max_workers=1)
+
+        return self.background_executor.submit(function, *args)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire()
+
+            started = time.perf_counter()
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except Exception as e:
+                self.record_request(method, url, kwargs, type(e).__name__, started)
+                raise
+
+            self.record_request(
+                method, url, kwargs, response.status_code, started, response
+            )
+
+            # Rate limited requests weren't acted on so, whatever their method,
+            # they can be retried once every thread has waited as asked
+            if response.status_code != RATE_LIMITED or attempt >= self.retries:
+                return response
+
+            self.rate_limiter.pause(
+                ratelimit.retry_after(response, attempt, self.backoff)
+            )
+            attempt += 1
+
+    def record_request(self, method, url, kwargs, status, started, response=None):
+        if instrumentation.enabled:
+            instrumentation.metrics.add_request(
+                method,
+                url,
+                status,
+                len(kwargs.get("data") or ""),
+                len(response.content) if response is not None else 0,
+                time.perf_counter() - started,
+            )
+
+    def get(self, url, params=None):
+        return self.request("GET", url, params=params)
+
+    def post(self, url, data):
+        return self.request("POST", url, data=json.dumps(data))
+
+    def put(self, url, data):
+        return self.request("PUT", url, data=json.dumps(data))
+
+    def workspaces(self):
+        response = self.get(self.workspaces_url())
         return response.json()
 
-    def delete_entry(self, entry_id):
-        url = "{}workspaces/{}/time-entries/{}/".format(
-            self.url, self.workspace, entry_id
+    def all_projects(self, page_size=None):
+        return self.all_pages(self.projects_url(), page_size=page_size)
+
+    def projects(self, limit=None):
+        response = self.get(self.projects_url(), params=self.projects_params(limit))
+        return response.json()
+
+    def user(self, refresh=False):
+        user = self.cached_user(refresh)
+
+        if user is None:
+            with instrumentation.phase("user profile"):
+                user = self.remember_user(self.get(self.user_url()).json())
+
+        return user
+
+    def create_entry(
+        self,
+        project,
+        description,
+        hours,
+        date=None,
+        start_time=None,
+        billable=False,
+        task=None,
+    ):
+        data = self.new_entry_data(
+            project, description, hours, date, start_time, billable, task
         )
-        return requests.delete(url, headers=self.headers)
 
-    def entries(self, start=None, end=None, strict=False):
+        return self.submit_entry(data).json()
+
+    def submit_entry(self, data):
+        return self.post(self.entries_url(), data)
+
+    def delete_entry(self, entry_id):
+        return self.request("DELETE", self.entry_url(entry_id))
+
+    def update_entry(self, entry_id, data):
+        return self.put(self.entry_url(entry_id), data).json()
+
+    def entries(self, start=None, end=None, strict=False, page_size=None):
+        entries = []
+
+        for page in self.entry_pages(start, end, strict, page_size):
+            entries += page
+
+        return entries
+
+    def entry_pages(self, start=None, end=None, strict=False, page_size=None):
         user = self.user()
 
-        params = {}
+        params = self.entries_params(start, end)
+        url = self.user_entries_url(user["id"])
 
-        if start:
-            params["start"] = self.local_date_string_to_utc_iso_8601(start)
-        if end:
-            params["end"] = self.local_date_string_to_utc_iso_8601(end)
+        for page in self.pages(url, params, page_size):
+            self.remember_entries(page)
 
-        url = "{}workspaces/{}/user/{}/time-entries".format(
-            self.url, self.workspace, user["id"]
-        )
-        response = requests.get(url, params=params, headers=self.headers)
+            yield page
 
-        response_data = response.json()
+    def pages(self, url, params=None, page_size=None):
+        from concurrent.futures import ThreadPoolExecutor
 
-        return response_data
+        # Yield each page of results, fetching the next page while the current one
+        # is being handled by the caller
+        params = self.page_params(params, page_size)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page_number = 1
+            future = executor.submit(self.get_page, url, params, page_number)
+
+            while future is not None:
+                results = future.result()
+
+                # A full page means there may be more results on the next page
+                future = None
+
+                if not self.last_page(results, params):
+                    page_number += 1
+                    future = executor.submit(self.get_page, url, params, page_number)
+
+                yield results
+
+    def all_pages(self, url, params=None, page_size=None):
+        # Return all results, fetching a page at a time: the number of pages isn't
+        # known until a page isn't full, so fetching pages concurrently would mean
+        # requesting pages past the last one
+        params = self.page_params(params, page_size)
+
+        results = []
+        page_number = 1
+
+        while True:
+            page = self.get_page(url, params, page_number)
+            results += page
+
+            if self.last_page(page, params):
+                return results
+
+            page_number += 1
+
+    def get_page(self, url, params, page_number):
+        response = self.get(url, params=dict(params, page=page_number))
+        return self.page_results(response.json())
 
     def get_project(self, project_id):
-        url = "{}workspaces/{}/projects/{}/".format(
-            self.url, self.workspace, project_id
-        )
-        response = requests.get(url, headers=self.headers)
+        response = self.get(self.project_url(project_id))
         return response.json()
 
     def get_task(self, projectId, taskId):
-        url = "{}workspaces/{}/projects/{}/tasks/{}/".format(
-            self.url, self.workspace, projectId, taskId
-        )
-        response = requests.get(url, headers=self.headers)
+        response = self.get(self.task_url(projectId, taskId))
         return response.json()
 
     def get_entry(self, entry_id):
         url = "{}workspaces/{}/time-entries/{}".format(
             self.url, self.workspace, entry_id
         )
-        response = requests.get(url, headers=self.headers)
+        response = self.get(url)
         return response.json()
 
     def project_tasks(self, project_id):
-        url = "{}workspaces/{}/projects/{}/tasks/".format(
-            self.url, self.workspace, project_id
-        )
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        return self.all_pages(self.project_tasks_url(project_id))
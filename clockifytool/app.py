@@ -1,10 +1,200 @@
+import json
 import os
+import sys
+import time
+from datetime import date, datetime
 
-import yaml
+from clockifytool import __version__ as VERSION
+from clockifytool import daemon
+
+CONFIG_FILENAME = ".cft.yml"
+
+# Increment when the format of the compiled configuration changes
+COMPILED_CONFIG_VERSION = 1
+
+# Arguments that don't need the configuration file to be loaded
+NO_CONFIG_ARGUMENTS = ["version", "-v", "--version", "-h", "--help"]
+
+
+def main(argv=None):
+    """Run the command given on the command line, using the daemon if running.
+    Returns:
+        int: Exit status.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    try:
+        if not argv or argv[0] != "daemon":
+            status = daemon.forward(argv)
+
+            if status is not None:
+                return status
+
+        return run(argv)
+    except BrokenPipeError:
+        # Output is streamed so whatever it's piped to (such as head) may stop
+        # reading it early: point stdout at devnull so it isn't written to, and
+        # fail again, when flushed on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+def run(argv, apis=None):
+    """Run a command in this process.
+
+    API clients can be reused, between commands, by passing a dict to store them
+    in by configuration.
+    Returns:
+        int: Exit status.
+    """
+    started = time.perf_counter()
+
+    # Imported here so forwarding commands to the daemon doesn't wait for them
+    from clockifytool import cli, instrumentation, periods
+
+    imported = time.perf_counter()
+
+    # Load configuration, which may define periods, unless only the version, or
+    # general help, is wanted (config might not exist yet)
+    config = None
+    config_error = None
+
+    if not argv or argv[0] not in NO_CONFIG_ARGUMENTS:
+        try:
+            config = load_config()
+            periods.configure(config)
+        except Exception as e:
+            config_error = e
+
+    configured = time.perf_counter()
+
+    # Parse CLI arguments
+    parser = cli.arg_parser()
+    args = parser.parse_args(cli.preprocess_argv(argv))
+
+    if getattr(args, "profile", False) or getattr(args, "profile_output", None):
+        instrumentation.enable(started)
+        instrumentation.metrics.add_phase("imports", imported - started)
+        instrumentation.metrics.add_phase("configuration", configured - imported)
+
+        return profile(args, run_command, args, parser, config, config_error, apis)
+
+    return run_command(args, parser, config, config_error, apis)
+
+
+def profile(args, function, *arguments):
+    """Call a function, recording where time is spent, and report it to stderr."""
+    from clockifytool import instrumentation
+
+    profiler = None
+
+    if args.profile_output:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with instrumentation.phase("command"):
+            return function(*arguments)
+    finally:
+        instrumentation.disable()
+
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_output)
+
+        sys.stderr.write(instrumentation.metrics.report())
+
+        if profiler is not None:
+            print(
+                "cProfile statistics written to {}.".format(args.profile_output),
+                file=sys.stderr,
+            )
+
+
+def run_command(args, parser, config, config_error, apis=None):
+    """Run a command given its parsed arguments and the configuration.
+    Returns:
+        int: Exit status.
+    """
+    from clockifytool import cli, commands, instrumentation
+
+    # Display version if need be
+    if args.command == "version":
+        if args.format != "text":
+            from clockifytool import render
+
+            render.write_record({"version": VERSION}, args.format)
+        else:
+            print("clockifytool version {}".format(VERSION))
+        return 0
+
+    if args.command == "daemon":
+        if args.stop:
+            return daemon.stop()
+
+        return daemon.serve(run)
+
+    if config is None:
+        print(str(config_error))
+        return 1
+
+    # Authenticate, reusing an API client if one has been created already
+    config_key = json.dumps(config, sort_keys=True)
+    clockify = apis.get(config_key) if apis is not None else None
+
+    if clockify is None:
+        with instrumentation.phase("API client"):
+            clockify = create_api(config)
+
+        if apis is not None:
+            apis.clear()
+            apis[config_key] = clockify
+
+    # Display available workspaces or set workspace
+    if "workspace" not in config:
+        config_path = os.path.join(os.path.expanduser("~"), config["filename"])
+        print('Please set workspace ID as "workspace" in {}.'.format(config_path))
+        print("\nAvailable workspaces:")
+        commands.list_workspaces(None, None, {"clockify": clockify})
+        return 1
+    else:
+        clockify.set_workspace(config["workspace"])
+
+    # Validate CLI arguments and execute command
+    args = cli.validate_args(parser, args, config)
+    command_function = getattr(commands, args.func)
+
+    app_data = {"clockify": clockify}
+    command_function(args, config, app_data)
+
+    return 0
+
+
+def create_api(config):
+    """Return Clockify API client configured using this application's config."""
+    from clockifytool import ratelimit
+    from clockifytool.api import ClockifyApi, ClockifyEntryCacheManager
+
+    return ClockifyApi(
+        config["api key"],
+        url=config.get("api url"),
+        pool_size=config.get("pool size", 10),
+        retries=config.get("max retries", 3),
+        timeout=config.get("timeout", 30),
+        page_size=config.get("page size", 200),
+        rate_limit=config.get("rate limit", ratelimit.DEFAULT_RATE),
+        cache=ClockifyEntryCacheManager.from_config(config.get("cache", {})),
+    )
 
 
 def load_config():
     """Return configuration, from YAML file, for this application.
+
+    The parsed configuration is cached, in a faster to load format, until the
+    YAML file changes.
     Raises:
         Exception: If not able to read or parse the configuration file for any
                    reason or if "base branch" isn't set in the configuration
@@ -12,27 +202,116 @@ def load_config():
     Returns:
         dict: Configuration information.
     """
-    config_filename = ".cft.yml"
-
     # Attempt to load configuration file from user's home directory
-    config_path = os.path.join(os.path.expanduser("~"), config_filename)
+    config_path = os.path.join(os.path.expanduser("~"), CONFIG_FILENAME)
+
+    try:
+        stat = os.stat(config_path)
+    except OSError:
+        raise Exception(
+            "Unable to load ~/{}: does it exist (or is there a YAML error)?".format(
+                CONFIG_FILENAME
+            )
+        )
+
+    # Identify the version of the configuration file the compiled config is from
+    source = {
+        "path": config_path,
+        "modified": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "version": COMPILED_CONFIG_VERSION,
+    }
+
+    from clockifytool import cache
+
+    compiled_path = os.path.join(cache.get_cache_directory(), "config.json")
+    config = load_compiled_config(compiled_path, source)
+
+    if config is None:
+        config = compile_config(config_path)
+        save_compiled_config(compiled_path, source, config)
+
+    return config
+
+
+def compile_config(config_path):
+    """Return configuration parsed from YAML file, with aliases resolved."""
+    import yaml
+
+    from clockifytool import helpers
 
     try:
-        config = yaml.safe_load(open(config_path))
+        with open(config_path) as config_file:
+            config = yaml.safe_load(config_file)
     except IOError:
         raise Exception(
             "Unable to load ~/{}: does it exist (or is there a YAML error)?".format(
-                config_filename
+                CONFIG_FILENAME
             )
         )
 
     # Add config filename to config
-    config["filename"] = config_filename
+    config["filename"] = CONFIG_FILENAME
 
     # Verify Clockify API key has been set in the config file
     if "api key" not in config:
         raise Exception(
-            'Please set Clockify API key as "api key" in {}.'.format(config_filename)
+            'Please set Clockify API key as "api key" in {}.'.format(CONFIG_FILENAME)
         )
 
-    return config
+    # Resolve every alias to a project or task ID ahead of time
+    config["aliases"] = helpers.compile_aliases(config.get("projects") or {})
+
+    return json_compatible(config)
+
+
+def json_compatible(value):
+    # YAML parses dates into objects so store them as strings instead
+    if isinstance(value, dict):
+        return {str(key): json_compatible(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [json_compatible(item) for item in value]
+
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    return value
+
+
+def load_compiled_config(compiled_path, source):
+    from clockifytool import cache
+
+    try:
+        with open(compiled_path) as compiled_file:
+            # The cache directory may be shared with other users so don't trust a
+            # compiled config they could have written (to collect the API key)
+            if not cache.owned_privately(os.fstat(compiled_file.fileno())):
+                return
+
+            compiled = json.load(compiled_file)
+    except (IOError, ValueError):
+        return
+
+    if compiled.get("source") == source:
+        return compiled["config"]
+
+
+def save_compiled_config(compiled_path, source, config):
+    # The configuration includes the API key so only the user can read it
+    temporary_path = "{}.{}".format(compiled_path, os.getpid())
+
+    try:
+        # Never write through a file, or symbolic link, someone else created
+        descriptor = os.open(
+            temporary_path,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0),
+            0o600,
+        )
+
+        with os.fdopen(descriptor, "w") as compiled_file:
+            json.dump({"source": source, "config": config}, compiled_file)
+
+        os.replace(temporary_path, compiled_path)
+    except OSError:
+        pass
@@ -0,0 +1,303 @@
+"""asyncio client for the Clockify API.
+
+AsyncClockifyApi has the same methods as ClockifyApi, as coroutines, and shares
+its URLs, parameters, request data and handling of responses (see
+api.ClockifyEndpoints) so the two behave alike. Requests are made using aiohttp,
+if it's installed (pip install clockifytool[async]), sharing one connection
+pool, or otherwise by a ClockifyApi in worker threads. Either way a semaphore
+limits how many requests are made at once.
+
+    async with AsyncClockifyApi(key) as clockify:
+        clockify.set_workspace(workspace_id)
+        tasks = await asyncio.gather(
+            *[clockify.project_tasks(project_id) for project_id in project_ids]
+        )
+"""
+
+import asyncio
+import json
+import time
+from functools import partial
+
+from clockifytool import api, instrumentation, ratelimit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class Response(object):
+    """Status and decoded JSON body of a response, like a requests response."""
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        if self.data is None:
+            raise ValueError("Response has no JSON body.")
+
+        return self.data
+
+
+class AsyncClockifyApi(api.ClockifyEndpoints):
+    def __init__(
+        self,
+        apiKey,
+        url=None,
+        concurrency=10,
+        retries=3,
+        backoff=0.5,
+        timeout=30,
+        cache=None,
+        page_size=200,
+        transport=None,
+        rate_limit=ratelimit.DEFAULT_RATE,
+        rate_limiter=None,
+    ):
+        super(AsyncClockifyApi, self).__init__(apiKey, url, page_size)
+
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.http_session = None
+        self.semaphore = None
+
+        # Use aiohttp unless it's not installed, or the sync transport's wanted
+        if transport is None:
+            transport = "aiohttp" if aiohttp is not None else "threads"
+
+        self.transport = transport
+        self.sync_api = None
+
+        if self.transport == "threads":
+            # The sync client shares the cache, and makes requests, for us
+            self.sync_api = api.ClockifyApi(
+                apiKey,
+                url=url,
+                pool_size=concurrency,
+                retries=retries,
+                backoff=backoff,
+                timeout=timeout,
+                cache=cache,
+                page_size=page_size,
+                rate_limit=rate_limit,
+            )
+            cache = self.sync_api.cache
+            rate_limiter = self.sync_api.rate_limiter
+
+        # Requests are paced, by a rate limiter that can be shared with other
+        # clients, to stay within Clockify's rate limit
+        if rate_limiter is None:
+            rate_limiter = ratelimit.TokenBucket(rate_limit)
+
+        self.rate_limiter = rate_limiter
+
+        self.cache = cache
+
+        if self.cache is None:
+            self.cache = api.ClockifyEntryCacheManager()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.http_session is not None:
+            await self.http_session.close()
+            self.http_session = None
+
+    def set_workspace(self, workspace_id):
+        super(AsyncClockifyApi, self).set_workspace(workspace_id)
+
+        if self.sync_api is not None:
+            self.sync_api.set_workspace(workspace_id)
+
+    @property
+    def limiter(self):
+        # Created when first needed so it belongs to the running event loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        return self.semaphore
+
+    @property
+    def session(self):
+        if self.http_session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+
+            self.http_session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+
+        return self.http_session
+
+    async def request(self, method, url, params=None, data=None):
+        async with self.limiter:
+            if self.transport == "threads":
+                return await self.thread_request(method, url, params, data)
+
+            return await self.aiohttp_request(method, url, params, data)
+
+    async def thread_request(self, method, url, params=None, data=None):
+        loop = asyncio.get_running_loop()
+        body = json.dumps(data) if data is not None else None
+
+        return await loop.run_in_executor(
+            None,
+            partial(self.sync_api.request, method, url, params=params, data=body),
+        )
+
+    async def aiohttp_request(self, method, url, params=None, data=None):
+        # Retry rate limited requests, and idempotent requests that hit transient
+        # server errors, like the sync client does: other requests may have been
+        # acted on so could be duplicated
+        idempotent = method in ("GET", "PUT", "DELETE")
+        attempt = 0
+
+        while True:
+            await self.rate_limiter.acquire_async()
+
+            started = time.perf_counter()
+
+            async with self.session.request(
+                method, url, params=params, json=data
+            ) as response:
+                rate_limited = response.status == api.RATE_LIMITED
+                retry = attempt < self.retries and (
+                    rate_limited
+                    or (response.status in api.RETRY_STATUSES and idempotent)
+                )
+
+                if not retry:
+                    body = await response.read()
+
+                    if instrumentation.enabled:
+                        instrumentation.metrics.add_request(
+                            method,
+                            url,
+                            response.status,
+                            len(json.dumps(data)) if data is not None else 0,
+                            len(body),
+                            time.perf_counter() - started,
+                        )
+
+                    return Response(response.status, json.loads(body) if body else None)
+
+                delay = ratelimit.retry_after(response, attempt, self.backoff)
+
+            attempt += 1
+
+            # Hold back every request sharing the rate limiter, not just this one
+            if rate_limited:
+                self.rate_limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+
+    async def get(self, url, params=None):
+        return await self.request("GET", url, params=params)
+
+    async def post(self, url, data):
+        return await self.request("POST", url, data=data)
+
+    async def put(self, url, data):
+        return await self.request("PUT", url, data=data)
+
+    async def workspaces(self):
+        response = await self.get(self.workspaces_url())
+        return response.json()
+
+    async def all_projects(self, page_size=None):
+        return await self.all_pages(self.projects_url(), page_size=page_size)
+
+    async def projects(self, limit=None):
+        response = await self.get(
+            self.projects_url(), params=self.projects_params(limit)
+        )
+        return response.json()
+
+    async def user(self, refresh=False):
+        user = self.cached_user(refresh)
+
+        if user is None:
+            response = await self.get(self.user_url())
+            user = self.remember_user(response.json())
+
+        return user
+
+    async def create_entry(
+        self,
+        project,
+        description,
+        hours,
+        date=None,
+        start_time=None,
+        billable=False,
+        task=None,
+    ):
+        data = self.new_entry_data(
+            project, description, hours, date, start_time, billable, task
+        )
+        response = await self.submit_entry(data)
+
+        return response.json()
+
+    async def submit_entry(self, data):
+        return await self.post(self.entries_url(), data)
+
+    async def delete_entry(self, entry_id):
+        return await self.request("DELETE", self.entry_url(entry_id))
+
+    async def update_entry(self, entry_id, data):
+        response = await self.put(self.entry_url(entry_id), data)
+        return response.json()
+
+    async def entries(self, start=None, end=None, strict=False, page_size=None):
+        user = await self.user()
+
+        entries = await self.all_pages(
+            self.user_entries_url(user["id"]),
+            self.entries_params(start, end),
+            page_size,
+        )
+
+        self.remember_entries(entries)
+
+        return entries
+
+    async def all_pages(self, url, params=None, page_size=None):
+        # Return all results, fetching a page at a time as the sync client does
+        params = self.page_params(params, page_size)
+
+        results = []
+        page_number = 1
+
+        while True:
+            page = await self.get_page(url, params, page_number)
+            results += page
+
+            if self.last_page(page, params):
+                return results
+
+            page_number += 1
+
+    async def get_page(self, url, params, page_number):
+        response = await self.get(url, params=dict(params, page=page_number))
+        return self.page_results(response.json())
+
+    async def get_project(self, project_id):
+        response = await self.get(self.project_url(project_id))
+        return response.json()
+
+    async def get_task(self, projectId, taskId):
+        response = await self.get(self.task_url(projectId, taskId))
+        return response.json()
+
+    async def project_tasks(self, project_id):
+        return await self.all_pages(self.project_tasks_url(project_id))
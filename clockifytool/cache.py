@@ -0,0 +1,430 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+# Kind of cached object stored when no prefix is given
+DEFAULT_KIND = "entry"
+
+# Default number of seconds cached objects, of each kind, are considered fresh
+DAY = 24 * 60 * 60
+DEFAULT_TTLS = {
+    "entry": 7 * DAY,
+    "project": DAY,
+    "task": 7 * DAY,
+    "project-tasks": 7 * DAY,
+    "catalogue": DAY,
+}
+
+# Names used in the configuration file for each kind of object
+TTL_CONFIG_NAMES = {
+    "entries": "entry",
+    "projects": "project",
+    "tasks": "task",
+    "project tasks": "project-tasks",
+    "project catalogue": "catalogue",
+}
+
+# Default maximum number of cached projects and tasks
+DEFAULT_MAX_SIZE = 100000
+
+
+def get_cache_directory():
+    cache_dir = os.path.join(tempfile.gettempdir(), "cft")
+
+    if not os.path.isdir(cache_dir):
+        os.mkdir(cache_dir)
+
+    return cache_dir
+
+
+def get_private_directory():
+    # Unlike the cache directory, which may be shared with other users, only the
+    # current user can access this directory so what's kept in it can be trusted
+    base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    private_dir = os.path.join(base_dir, "cft")
+
+    if not os.path.isdir(private_dir):
+        os.makedirs(private_dir, 0o700)
+
+    if not owned_privately(os.stat(private_dir)):
+        raise Exception(
+            "{} must belong to you, and be inaccessible to others.".format(private_dir)
+        )
+
+    return private_dir
+
+
+def owned_privately(stat):
+    # Whether a file belongs to this user and no one else can read or write it
+    if not hasattr(os, "getuid"):
+        return True
+
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+
+def create_backend(name=None, directory=None):
+    if directory is None:
+        directory = get_cache_directory()
+
+    if name is None or name == "sqlite":
+        return SqliteCacheBackend(directory)
+
+    if name == "files":
+        return FileCacheBackend(directory)
+
+    raise Exception('Unknown cache backend "{}".'.format(name))
+
+
+def ttls_from_config(cache_config):
+    ttls = DEFAULT_TTLS.copy()
+
+    for name, ttl in cache_config.get("ttl", {}).items():
+        if name not in TTL_CONFIG_NAMES:
+            raise Exception('Unknown cache TTL "{}".'.format(name))
+
+        ttls[TTL_CONFIG_NAMES[name]] = ttl
+
+    return ttls
+
+
+def data_start(data):
+    # Note when a time entry started, to the second, so entries can be found by date
+    if isinstance(data, dict) and isinstance(data.get("timeInterval"), dict):
+        return data["timeInterval"]["start"][:19]
+
+
+def data_project_id(data):
+    # Note the project an object belongs to, if any, so it can be indexed
+    if not isinstance(data, dict):
+        return
+
+    if data.get("projectId"):
+        return data["projectId"]
+
+    if isinstance(data.get("project"), dict):
+        return data["project"].get("id")
+
+
+class FileCacheBackend(object):
+    """Cache each object as a JSON file in the cache directory.
+
+    A file's modification time records when it was cached and its access time
+    records when it was last read.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def filepath(self, kind, identifier):
+        if kind != DEFAULT_KIND:
+            identifier = kind + "-" + identifier
+
+        return os.path.join(self.directory, "cft-{}".format(identifier))
+
+    def get(self, kind, identifier):
+        filepath = self.filepath(kind, identifier)
+
+        if not os.path.isfile(filepath):
+            return
+
+        with open(filepath) as json_file:
+            data = json.load(json_file)
+
+        updated = os.path.getmtime(filepath)
+        os.utime(filepath, (time.time(), updated))
+
+        return data, updated
+
+    def set(self, kind, identifier, data):
+        with open(self.filepath(kind, identifier), "w") as cache_file:
+            cache_file.write(json.dumps(data))
+
+    def set_many(self, kind, items):
+        for identifier, data in items:
+            self.set(kind, identifier, data)
+
+    def delete(self, kind, identifier):
+        filepath = self.filepath(kind, identifier)
+
+        if os.path.isfile(filepath):
+            os.remove(filepath)
+
+    def delete_many(self, kind, identifiers):
+        for identifier in identifiers:
+            self.delete(kind, identifier)
+
+    def query(self, kind, start_from, start_to):
+        # Objects don't have their start indexed so check every time entry
+        objects = []
+
+        for identifier in self.identifiers(kind):
+            data, _ = self.get(kind, identifier)
+            start = data_start(data)
+
+            if start is not None and start_from <= start <= start_to:
+                objects.append(data)
+
+        return sorted(objects, key=data_start, reverse=True)
+
+    def identifiers(self, kind, updated_after=None):
+        prefix = "cft-" if kind == DEFAULT_KIND else "cft-{}-".format(kind)
+
+        return set(
+            filename[len(prefix) :]
+            for filename in self.filenames()
+            if filename.startswith(prefix)
+            and (
+                updated_after is None
+                or os.path.getmtime(os.path.join(self.directory, filename))
+                > updated_after
+            )
+        )
+
+    def filenames(self):
+        return [
+            filename
+            for filename in os.listdir(self.directory)
+            if filename.startswith("cft-")
+        ]
+
+    def counts(self):
+        count = len(self.filenames())
+
+        return {"object": count} if count else {}
+
+    def evict(self, kinds, max_size):
+        # Remove the least recently read objects of the given kinds, leaving at
+        # most max_size of them
+        filepaths = [
+            os.path.join(self.directory, filename)
+            for filename in self.filenames()
+            if self.filename_kind(filename, kinds) in kinds
+        ]
+
+        if len(filepaths) <= max_size:
+            return
+
+        filepaths.sort(key=os.path.getatime)
+
+        for filepath in filepaths[: len(filepaths) - max_size]:
+            os.remove(filepath)
+
+    def filename_kind(self, filename, kinds):
+        # Return which of the given, or default, kinds of object a file holds, if
+        # any: a kind can begin with another (such as "project-tasks" and
+        # "project") so the longest matching kind is used
+        for kind in sorted(set(kinds) | set(DEFAULT_TTLS), key=len, reverse=True):
+            if filename.startswith("cft-{}-".format(kind)):
+                return kind
+
+    def flush(self):
+        for filename in self.filenames():
+            os.remove(os.path.join(self.directory, filename))
+
+
+class SqliteCacheBackend(object):
+    """Cache objects in a single SQLite database, with a table per kind of object.
+
+    Each table is indexed by object ID, by the ID of the project the object
+    belongs to (if any), and by start time (for time entries). When each object
+    was cached, and last read, is also recorded.
+    """
+
+    filename = "cache.sqlite3"
+
+    # Increment when the table layout changes so outdated tables get rebuilt
+    schema_version = 3
+
+    def __init__(self, directory):
+        import sqlite3
+
+        self.directory = directory
+        self.path = os.path.join(directory, self.filename)
+        self.lock = threading.Lock()
+        self.tables = set()
+
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        rows = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+        self.tables.update(row[0] for row in rows)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        if version != self.schema_version:
+            self.flush()
+            self.connection.execute(
+                "PRAGMA user_version = {}".format(self.schema_version)
+            )
+
+    def table(self, kind):
+        table = kind.replace("-", "_")
+
+        if not re.match(r"^[a-z_]+$", table):
+            raise Exception('Invalid cache kind "{}".'.format(kind))
+
+        if table not in self.tables:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS {} ("
+                    "id TEXT PRIMARY KEY, project_id TEXT, start TEXT, "
+                    "data TEXT NOT NULL, updated REAL NOT NULL, accessed REAL NOT NULL"
+                    ")".format(table)
+                )
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS {0}_project_id "
+                    "ON {0} (project_id)".format(table)
+                )
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS {0}_start ON {0} (start)".format(table)
+                )
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS {0}_accessed "
+                    "ON {0} (accessed)".format(table)
+                )
+
+            self.tables.add(table)
+
+        return table
+
+    def get(self, kind, identifier):
+        table = self.table(kind)
+
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT data, updated FROM {} WHERE id = ?".format(table),
+                (identifier,),
+            ).fetchone()
+
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE {} SET accessed = ? WHERE id = ?".format(table),
+                    (time.time(), identifier),
+                )
+
+        if row is not None:
+            return json.loads(row[0]), row[1]
+
+    def set(self, kind, identifier, data):
+        self.set_many(kind, [(identifier, data)])
+
+    def set_many(self, kind, items):
+        table = self.table(kind)
+        now = time.time()
+
+        rows = [
+            (
+                identifier,
+                data_project_id(data),
+                data_start(data),
+                json.dumps(data),
+                now,
+                now,
+            )
+            for identifier, data in items
+        ]
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO {} "
+                "(id, project_id, start, data, updated, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)".format(table),
+                rows,
+            )
+
+    def delete(self, kind, identifier):
+        table = self.table(kind)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM {} WHERE id = ?".format(table), (identifier,)
+            )
+
+    def delete_many(self, kind, identifiers):
+        table = self.table(kind)
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM {} WHERE id = ?".format(table),
+                [(identifier,) for identifier in identifiers],
+            )
+
+    def query(self, kind, start_from, start_to):
+        table = self.table(kind)
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT data FROM {} WHERE start BETWEEN ? AND ? "
+                "ORDER BY start DESC".format(table),
+                (start_from, start_to),
+            ).fetchall()
+
+        return [json.loads(row[0]) for row in rows]
+
+    def identifiers(self, kind, updated_after=None):
+        table = self.table(kind)
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id FROM {} WHERE updated > ?".format(table),
+                (updated_after or 0,),
+            ).fetchall()
+
+        return set(row[0] for row in rows)
+
+    def counts(self):
+        counts = {}
+
+        with self.lock:
+            for table in sorted(self.tables):
+                count = self.connection.execute(
+                    "SELECT COUNT(*) FROM {}".format(table)
+                ).fetchone()[0]
+
+                if count:
+                    counts[table.replace("_", "-")] = count
+
+        return counts
+
+    def evict(self, kinds, max_size):
+        # Remove the least recently read objects of the given kinds, leaving at
+        # most max_size of them
+        tables = [self.table(kind) for kind in kinds]
+        objects = " UNION ALL ".join(
+            "SELECT '{0}' AS source, id, accessed FROM {0}".format(table)
+            for table in tables
+        )
+
+        with self.lock, self.connection:
+            count = self.connection.execute(
+                "SELECT COUNT(*) FROM ({})".format(objects)
+            ).fetchone()[0]
+
+            if count <= max_size:
+                return
+
+            rows = self.connection.execute(
+                "SELECT source, id FROM ({}) ORDER BY accessed LIMIT ?".format(objects),
+                (count - max_size,),
+            ).fetchall()
+
+            for table in tables:
+                self.connection.executemany(
+                    "DELETE FROM {} WHERE id = ?".format(table),
+                    [(identifier,) for source, identifier in rows if source == table],
+                )
+
+    def flush(self):
+        with self.lock, self.connection:
+            for table in self.tables:
+                self.connection.execute("DROP TABLE IF EXISTS {}".format(table))
+
+        self.tables = set()
@@ -2,22 +2,36 @@ import argparse
 import os
 import sys
 
-import dateutil
-
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
 
-from clockifytool import helpers
+from clockifytool import helpers, periods, render, report
+
+# Options that can be given before the command, and how many values each takes
+GLOBAL_OPTIONS = {"--profile": 0, "--profile-output": 1}
 
 
-def preprocess_argv():
+def preprocess_argv(argv=None):
     # Remove script from argv
-    argv = sys.argv[1:]
+    if argv is None:
+        argv = sys.argv[1:]
+
+    argv = list(argv)
+
+    # Set global options aside so the command can be found
+    global_argv = []
+
+    while argv and argv[0].split("=")[0] in GLOBAL_OPTIONS:
+        count = 1 if "=" in argv[0] else 1 + GLOBAL_OPTIONS[argv[0]]
+        global_argv += argv[:count]
+        argv = argv[count:]
 
     if len(argv):
         command_abbreviations = {
             "l": "list",
+            "r": "report",
             "n": "new",
             "d": "delete",
+            "u": "update",
             "w": "workspaces",
             "p": "projects",
             "pd": "project",
@@ -32,14 +46,32 @@ def preprocess_argv():
         elif argv[0][0:1] == "+":
             # "+<project>" is shorthand for "new <project>"
             argv = ["new", argv[0][1:]] + argv[1:]
-        elif helpers.resolve_period_abbreviation(argv[0]):
+        elif periods.resolve_abbreviation(argv[0]):
             # If time period given, not command, use as basis for list command
             argv = ["list"] + argv[0:]
     else:
         # Default to "list" command
         argv = ["list"]
 
-    return argv
+    return global_argv + argv
+
+
+def add_profile_arguments(parser, suppress=False):
+    # Suppressed options are left unset, rather than set to defaults, if not given
+    defaults = {"default": argparse.SUPPRESS} if suppress else {}
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="report where time was spent, including HTTP requests and cache use",
+        **defaults
+    )
+    parser.add_argument(
+        "--profile-output",
+        metavar="file",
+        help="also write cProfile statistics to a file (implies --profile)",
+        **defaults
+    )
 
 
 def arg_parser():
@@ -48,9 +80,23 @@ def arg_parser():
     parser.add_argument(
         "-v", "--version", help="show version and exit", action="store_true"
     )
+    add_profile_arguments(parser)
 
     subparsers = parser.add_subparsers(dest="command")
 
+    # Parent parser for options common to all commands
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument(
+        "--format",
+        choices=render.FORMATS,
+        default="text",
+        help="output format: text, JSON, newline-delimited JSON (ndjson or jsonl), "
+        "or CSV/TSV with a header row",
+    )
+
+    # Also accepted after the command, without overriding them if given before it
+    add_profile_arguments(common_parser, suppress=True)
+
     # Parent parser for entry-specific commands
     entry_parser = argparse.ArgumentParser(add_help=False)
     entry_parser.add_argument(
@@ -72,7 +118,7 @@ def arg_parser():
 
     # New entry command
     parser_new = subparsers.add_parser(
-        "new", help="Create new time entry", parents=[entry_parser]
+        "new", help="Create new time entry", parents=[common_parser, entry_parser]
     )
     parser_new.add_argument(
         "id", metavar="project ID", help="ID of project or task: required"
@@ -80,9 +126,31 @@ def arg_parser():
     parser_new.add_argument("-s", "--start", metavar="start time", action="store")
     parser_new.set_defaults(func="new_entry")
 
+    # Import command
+    parser_import = subparsers.add_parser(
+        "import",
+        help="Create time entries from a CSV or YAML file",
+        parents=[common_parser],
+    )
+    parser_import.add_argument(
+        "file",
+        metavar="file",
+        help="CSV or YAML file with id, comments, hours, date, start and billable "
+        "fields: required",
+    )
+    parser_import.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="validate the file without creating time entries",
+    )
+    parser_import.set_defaults(func="import_entries")
+
     # List command
     parser_list = subparsers.add_parser(
-        "list", help="List time entries", epilog=helpers.describe_periods()
+        "list",
+        help="List time entries",
+        parents=[common_parser],
+        epilog=periods.describe(),
     )
     parser_list.add_argument(
         "period",
@@ -94,45 +162,171 @@ def arg_parser():
     parser_list.add_argument("-e", "--end", metavar="end date", action="store")
     parser_list.add_argument("--strict", action="store_true")
     parser_list.add_argument("-v", "--verbose", action="store_true")
+    mirror_list = parser_list.add_mutually_exclusive_group()
+    mirror_list.add_argument(
+        "--offline",
+        "--cached",
+        action="store_true",
+        help="list time entries from the local mirror without contacting Clockify",
+    )
+    mirror_list.add_argument(
+        "--refresh",
+        action="store_true",
+        help="fetch every day's time entries, even if mirrored, to pick up changes "
+        "made elsewhere",
+    )
     parser_list.set_defaults(func="list_entries")
 
+    # Report command
+    parser_report = subparsers.add_parser(
+        "report",
+        help="Report time totals",
+        parents=[common_parser],
+        epilog=periods.describe(),
+    )
+    parser_report.add_argument(
+        "period",
+        nargs="?",
+        metavar="period",
+        help="time period: optional, overrides -s and -e",
+    )
+    parser_report.add_argument("-s", "--start", metavar="start date", action="store")
+    parser_report.add_argument("-e", "--end", metavar="end date", action="store")
+    parser_report.add_argument(
+        "--by",
+        action="append",
+        choices=report.GROUPINGS,
+        help="group totals by: repeat to group by more than one, defaults to project",
+    )
+    mirror_report = parser_report.add_mutually_exclusive_group()
+    mirror_report.add_argument(
+        "--offline",
+        "--cached",
+        action="store_true",
+        help="report on time entries in the local mirror without contacting Clockify",
+    )
+    mirror_report.add_argument(
+        "--refresh",
+        action="store_true",
+        help="fetch every day's time entries, even if mirrored, to pick up changes "
+        "made elsewhere",
+    )
+    parser_report.set_defaults(func="report_entries")
+
+    # Parent parser for commands acting on many time entries
+    entries_parser = argparse.ArgumentParser(add_help=False)
+    entries_parser.add_argument(
+        "ids",
+        nargs="*",
+        metavar="time entry ID",
+        help="IDs of time entries: required unless a period or date range is given",
+    )
+    entries_parser.add_argument(
+        "-p", "--period", metavar="period", help="time period: overrides -s and -e"
+    )
+    entries_parser.add_argument("-s", "--start", metavar="start date", action="store")
+    entries_parser.add_argument("-e", "--end", metavar="end date", action="store")
+    entries_parser.add_argument(
+        "-y",
+        "--yes",
+        action="store_true",
+        help="change every time entry in the period or date range without listing "
+        "them first",
+    )
+
     # Delete command
-    parser_delete = subparsers.add_parser("delete", help="Delete time entry")
-    parser_delete.add_argument(
-        "id", metavar="time entry ID", help="ID of time entry: required"
+    parser_delete = subparsers.add_parser(
+        "delete",
+        help="Delete time entries",
+        parents=[common_parser, entries_parser],
+        epilog=periods.describe(),
     )
     parser_delete.set_defaults(func="delete_entry")
 
+    # Update command
+    parser_update = subparsers.add_parser(
+        "update",
+        help="Update time entries",
+        parents=[common_parser, entries_parser],
+        epilog=periods.describe(),
+    )
+    parser_update.add_argument("-c", "--comments", metavar="comments", action="store")
+    parser_update.add_argument(
+        "-t",
+        "--hours",
+        metavar="hours spent",
+        action="store",
+        help="new hours, or hours to add (+) or subtract (-)",
+    )
+    parser_update.add_argument(
+        "-d", "--date", metavar="date", action="store", help="new date"
+    )
+    parser_update.set_defaults(func="update_entries")
+
+    # Sync command
+    parser_sync = subparsers.add_parser(
+        "sync",
+        help="Send time entries, and deletions, queued while Clockify couldn't be "
+        "reached",
+        parents=[common_parser],
+    )
+    parser_sync.set_defaults(func="sync_outbox")
+
     # Workspaces command
-    parser_workspaces = subparsers.add_parser("workspaces", help="List workspaces")
+    parser_workspaces = subparsers.add_parser(
+        "workspaces", help="List workspaces", parents=[common_parser]
+    )
     parser_workspaces.set_defaults(func="list_workspaces")
 
     # Projects command
-    parser_projects = subparsers.add_parser("projects", help="List projects")
+    parser_projects = subparsers.add_parser(
+        "projects", help="List projects", parents=[common_parser]
+    )
     parser_projects.add_argument(
-        "-l", "--limit", metavar="number of projects per page", action="store"
+        "-l", "--limit", metavar="number of projects", action="store"
     )
     parser_projects.set_defaults(func="list_projects")
 
     # Project details command
-    parser_project = subparsers.add_parser("project", help="Project details")
+    parser_project = subparsers.add_parser(
+        "project", help="Project details", parents=[common_parser]
+    )
     parser_project.add_argument(
         "id", metavar="project ID", help="ID of project: required"
     )
     parser_project.set_defaults(func="project_details")
 
     # Task details command
-    parser_task = subparsers.add_parser("task", help="Task details")
+    parser_task = subparsers.add_parser(
+        "task", help="Task details", parents=[common_parser]
+    )
     parser_task.add_argument("id", metavar="task ID", help="ID of task: required")
     parser_task.set_defaults(func="task_details")
 
     # Cache command
-    parser_cache = subparsers.add_parser("cache", help="Cache status/management")
+    parser_cache = subparsers.add_parser(
+        "cache", help="Cache status/management", parents=[common_parser]
+    )
+    parser_cache.add_argument(
+        "action",
+        nargs="?",
+        choices=["warm", "refresh"],
+        help="warm: cache the tasks of all projects ahead of time, refresh: "
+        "refresh the cached user profile and project list",
+    )
     parser_cache.add_argument("-f", "--flush", action="store_true")
     parser_cache.set_defaults(func="cache_statistics")
 
+    # Daemon command
+    parser_daemon = subparsers.add_parser(
+        "daemon", help="Run commands in a long-running background process"
+    )
+    parser_daemon.add_argument(
+        "--stop", action="store_true", help="stop the running daemon"
+    )
+
     # Version commmand
-    subparsers.add_parser("version", help="Display version")
+    subparsers.add_parser("version", help="Display version", parents=[common_parser])
 
     return parser
 
@@ -140,7 +334,7 @@ def arg_parser():
 def validate_args(parser, args, config):
     # Normalize and validate period
     if "period" in args and args.period:
-        args.period = helpers.resolve_period_abbreviation(args.period)
+        args.period = periods.resolve_abbreviation(args.period)
         if not args.period:
             parser.error("Invalid period.")
 
@@ -148,10 +342,9 @@ def validate_args(parser, args, config):
     if "id" in args and args.id:
         if args.command == "new":
             # Allow use of preset comments and/or hours
-            default_comments = helpers.template_field(
-                args.id, "comments", config["projects"]
-            )
-            default_hours = helpers.template_field(args.id, "hours", config["projects"])
+            templates = config.get("projects") or {}
+            default_comments = helpers.template_field(args.id, "comments", templates)
+            default_hours = helpers.template_field(args.id, "hours", templates)
 
             if default_comments and not args.comments:
                 args.comments = default_comments
@@ -160,7 +353,7 @@ def validate_args(parser, args, config):
                 args.hours = default_hours
 
         # Resolve preset name to ID
-        args.id = helpers.resolve_project_alias(args.id, config["projects"])
+        args.id = helpers.resolve_project_alias(args.id, config["aliases"])
 
     # Resolve dates, if set
     if "date" in args and args.date:
@@ -192,6 +385,8 @@ def resolve_and_validate_date_value(value, parser):
     # Resolve date calculation
     value = helpers.handle_date_calculation_value(value)
 
+    import dateutil.parser
+
     # Make sure value is actually a date
     try:
         dateutil.parser.parse(value)
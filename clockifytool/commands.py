@@ -1,14 +1,34 @@
 import os
-import shutil
 import sys
 from datetime import date
 
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
 
-from clockifytool import helpers
+from clockifytool import helpers, importer, outbox, periods, render, report
 
+# Fields of the records written for queued operations
+OPERATION_FIELDS = ["key", "action", "status", "id", "error"]
 
-def list_entries(args, config, app_data):
+
+def structured(args):
+    # Whether output should be machine-readable records rather than text
+    return getattr(args, "format", "text") != "text"
+
+
+def notice(args, message):
+    # Keep messages out of machine-readable output
+    print(message, file=sys.stderr if structured(args) else sys.stdout)
+
+
+def entry_record(clockify, entry):
+    # Return a time entry as a record including its project and task names
+    projects, tasks = helpers.entry_projects_and_tasks(clockify, [entry])
+    helpers.augment_entry(entry, projects, tasks)
+
+    return render.entry_record(clockify, entry)
+
+
+def date_range(args):
     today_raw = date.today()
     today = today_raw.strftime("%Y-%m-%d")
 
@@ -32,48 +52,59 @@ def list_entries(args, config, app_data):
             from_date = args.start
             to_date = args.end
     else:
-        # List defaults to current day
+        # Default to current day
         from_date = today
         to_date = today
 
     # Periods will override --from and --to
-    if args.period and helpers.resolve_period(args.period):
-        period = helpers.resolve_period(args.period)
+    period = periods.resolve(args.period) if args.period else None
+
+    if period is not None:
         from_date = period["start"]
         to_date = period["end"]
 
+    return from_date, to_date
+
+
+def list_entries(args, config, app_data):
+    from_date, to_date = date_range(args)
+
     helpers.time_entry_list(
-        from_date, to_date, app_data["clockify"], args.strict, args.verbose
+        from_date,
+        to_date,
+        app_data["clockify"],
+        args.strict,
+        args.verbose,
+        args.offline,
+        args.format,
+        args.refresh,
+    )
+
+
+def report_entries(args, config, app_data):
+    from_date, to_date = date_range(args)
+
+    report.print_report(
+        app_data["clockify"],
+        from_date,
+        to_date,
+        args.by or ["project"],
+        args.offline,
+        args.format,
+        args.refresh,
     )
 
 
 def new_entry(args, config, app_data):
     if "hours" not in args or not args.hours:
-        print("Specify hours.")
+        notice(args, "Specify hours.")
         return
 
     if float(args.hours) <= 0:
-        print("Hours value must be positive.")
+        notice(args, "Hours value must be positive.")
         return
 
-    # Check if ID indicates a task rather than project
-    task_id = None
-    project_id = None
-
-    task = app_data["clockify"].cache.get_cached_entry(args.id, "task")
-
-    # If task hasn't been cached, cache all project tasks
-    if task is None:
-        helpers.cache_workspace_tasks(app_data["clockify"])
-        task = app_data["clockify"].cache.get_cached_entry(args.id, "task")
-
-    if task is not None:
-        project_id = task["projectId"]
-
-    if project_id is None:
-        project_id = args.id
-    else:
-        task_id = args.id
+    project_id, task_id = resolve_project_and_task(app_data["clockify"], args.id)
 
     # Set start time to default if date's different than current
     today_raw = date.today()
@@ -82,7 +113,9 @@ def new_entry(args, config, app_data):
     if args.date is not None and args.date != today and args.start is None:
         args.start = "08:00:00"
 
-    entry = app_data["clockify"].create_entry(
+    clockify = app_data["clockify"]
+
+    data = clockify.new_entry_data(
         project_id,
         args.comments,
         args.hours,
@@ -92,68 +125,493 @@ def new_entry(args, config, app_data):
         task=task_id,
     )
 
-    if "message" in entry and "code" in entry:
-        print(entry["message"])
+    # Journal the time entry first so it isn't lost if Clockify can't be reached
+    operations = outbox.journal("create", [data])
+    status, entry = outbox.flush(clockify, operations)[0]
+
+    if status == outbox.REJECTED:
+        notice(args, entry)
+        return
+
+    if status == outbox.PENDING:
+        if structured(args):
+            render.write_record(
+                operation_record(operations[0], status, entry), args.format
+            )
+        else:
+            print("Time entry queued as Clockify couldn't be reached: {}".format(entry))
+            print('Use "cft sync" to create it later.')
+        return
+
+    if structured(args):
+        render.write_record(entry_record(clockify, entry), args.format)
+    else:
+        print(helpers.entry_bullet_point(clockify, entry))
+        print("Time entry created.")
+
+    flush_outbox(args, clockify)
+
+
+def resolve_project_and_task(clockify, id_or_name):
+    # Check if ID (or name) indicates a project rather than a task. Cached, even
+    # expired, projects and tasks are used, and if Clockify can't be reached the
+    # ID is assumed to be a project's, so a new time entry can still be queued
+    import requests
+
+    from clockifytool.api import ClockifyApiError
+
+    try:
+        project_id, task_id = helpers.find_project_and_task(
+            clockify, id_or_name, allow_stale=True
+        )
+    except (requests.exceptions.RequestException, ClockifyApiError):
+        project_id, task_id = None, None
+
+    if project_id is None:
+        project_id = id_or_name
+
+    return project_id, task_id
+
+
+def import_entries(args, config, app_data):
+    try:
+        rows = importer.read_rows(args.file)
+    except Exception as e:
+        notice(args, str(e))
+        return
+
+    if not rows:
+        notice(args, "No time entries to import.")
+        return
+
+    entries, errors = importer.validate_rows(app_data["clockify"], rows, config)
+
+    # Don't create any time entries unless every row is valid
+    if errors:
+        if structured(args):
+            render.write_records(
+                ({"row": number, "error": error} for number, error in errors),
+                args.format,
+                ["row", "error"],
+            )
+        else:
+            for number, error in errors:
+                print("Row {}: {}".format(number, error))
+
+        notice(args, "No time entries created.")
+        return
+
+    if args.dry_run:
+        if structured(args):
+            render.write_records(
+                (dict(entry, row=number) for number, entry in enumerate(entries, 1)),
+                args.format,
+                ["row"] + importer.ENTRY_FIELDS,
+            )
+        else:
+            print("{} time entries are valid.".format(len(entries)))
+        return
+
+    results = importer.submit_entries(app_data["clockify"], entries)
+
+    if structured(args):
+        render.write_records(
+            (
+                import_record(app_data["clockify"], number, entry)
+                for number, entry in enumerate(results, 1)
+            ),
+            args.format,
+            ["row", "error"] + render.RECORD_FIELDS,
+        )
         return
 
-    print(helpers.entry_bullet_point(app_data["clockify"], entry))
-    print("Time entry created.")
+    created = 0
+
+    for number, entry in enumerate(results, 1):
+        if "message" in entry and "code" in entry:
+            print("Row {}: {}".format(number, entry["message"]))
+        else:
+            created += 1
+            print(
+                "Row {}: {}".format(
+                    number, helpers.entry_bullet_point(app_data["clockify"], entry)
+                ),
+                end="",
+            )
+
+    print()
+    print("{} of {} time entries created.".format(created, len(results)))
+
+
+def import_record(clockify, number, entry):
+    if "message" in entry and "code" in entry:
+        return {"row": number, "error": entry["message"]}
+
+    return dict(entry_record(clockify, entry), row=number, error=None)
+
+
+def selected_entries(args, clockify):
+    # Return time entries given by ID, or in a period or date range, and the IDs
+    # of any that couldn't be found
+    if args.ids:
+        return helpers.entries_by_id(clockify, args.ids)
+
+    from_date, to_date = date_range(args)
+
+    return helpers.entries_in_range(clockify, from_date, to_date), []
+
+
+def confirm_selection(args, clockify, entries, action):
+    # Changing every time entry in a period requires confirmation via --yes
+    if args.ids or args.yes:
+        return True
+
+    output = sys.stderr if structured(args) else sys.stdout
+
+    print("Time entries to {}:".format(action), file=output)
+
+    for entry in entries:
+        print(helpers.entry_bullet_point(clockify, entry, True), end="", file=output)
+
+    print(file=output)
+    print(
+        "Use --yes to {} these {} time entries.".format(action, len(entries)),
+        file=output,
+    )
+
+    return False
 
 
 def delete_entry(args, config, app_data):
-    response = app_data["clockify"].delete_entry(args.id)
+    clockify = app_data["clockify"]
+
+    if not args.ids and not (args.period or args.start or args.end):
+        notice(args, "Specify time entry IDs or a period.")
+        return
+
+    # Time entries given by ID can be deleted without being looked up first
+    if args.ids:
+        entry_ids = args.ids
+    else:
+        entries, _ = selected_entries(args, clockify)
 
-    if response.status_code == 204:
-        cache_filepath = app_data["clockify"].cache.get_cache_filepath(args.id)
+        if not entries:
+            notice(args, "No time entries.")
+            return
 
-        if os.path.isfile(cache_filepath):
-            os.remove(cache_filepath)
+        if not confirm_selection(args, clockify, entries, "delete"):
+            return
 
+        entry_ids = [entry["id"] for entry in entries]
+
+    # Journal deletions first so they aren't lost if Clockify can't be reached
+    operations = outbox.journal("delete", [{"id": entry_id} for entry_id in entry_ids])
+    results = outbox.flush(clockify, operations)
+
+    deleted_ids = []
+    pending_ids = []
+
+    for entry_id, (status, result) in zip(entry_ids, results):
+        if status == outbox.APPLIED:
+            deleted_ids.append(entry_id)
+        elif status == outbox.PENDING:
+            pending_ids.append(entry_id)
+            notice(args, "Time entry {} queued: {}".format(entry_id, result))
+        else:
+            notice(args, "Time entry {} not found.".format(entry_id))
+
+    if structured(args):
+        render.write_records(
+            (
+                {
+                    "id": entry_id,
+                    "deleted": entry_id in deleted_ids,
+                    "pending": entry_id in pending_ids,
+                }
+                for entry_id in entry_ids
+            ),
+            args.format,
+            ["id", "deleted", "pending"],
+        )
+    elif len(entry_ids) == 1 and deleted_ids:
         print("Time entry deleted.")
+    elif len(entry_ids) > 1:
+        print("{} time entries deleted.".format(len(deleted_ids)))
+
+    if pending_ids:
+        notice(
+            args,
+            'Clockify couldn\'t be reached: use "cft sync" to delete {} queued time '
+            "entries later.".format(len(pending_ids)),
+        )
+    else:
+        flush_outbox(args, clockify)
+
+
+def update_entries(args, config, app_data):
+    clockify = app_data["clockify"]
+
+    if not args.ids and not (args.period or args.start or args.end):
+        notice(args, "Specify time entry IDs or a period.")
+        return
+
+    if not (args.hours or args.comments or args.date):
+        notice(args, "Specify hours, comments or date to update.")
+        return
+
+    entries, missing_ids = selected_entries(args, clockify)
+
+    for entry_id in missing_ids:
+        notice(args, "Time entry {} not found.".format(entry_id))
+
+    if not entries:
+        notice(args, "No time entries to update.")
+        return
+
+    if not confirm_selection(args, clockify, entries, "update"):
+        return
+
+    updates = []
+
+    for entry in entries:
+        # Running time entries have no duration yet
+        if not entry["timeInterval"].get("duration"):
+            notice(args, "Time entry {} is still running.".format(entry["id"]))
+            continue
+
+        # Hours default to the entry's current duration and can be relative to it
+        hours = clockify.cache.iso_duration_to_hours(entry["timeInterval"]["duration"])
+
+        if args.hours:
+            hours = helpers.handle_hours_calculation_value(hours, args.hours)
+
+        if hours <= 0:
+            notice(
+                args,
+                "Hours value for time entry {} must be positive.".format(entry["id"]),
+            )
+            continue
+
+        updates.append(
+            clockify.cache.generate_update_entry(
+                entry["id"], args.comments, args.date, hours
+            )
+        )
+
+    calls = [(clockify.update_entry, (update["id"], update)) for update in updates]
+    results = helpers.run_concurrently(calls, clockify.pool_size)
+
+    updated = []
+    writer = None
+
+    if structured(args):
+        writer = render.RecordWriter(args.format, render.RECORD_FIELDS + ["error"])
+        writer.start()
+
+    for update, entry in zip(updates, results):
+        if "id" in entry:
+            updated.append(entry)
+
+            if writer is not None:
+                writer.write(dict(entry_record(clockify, entry), error=None))
+            else:
+                print(helpers.entry_bullet_point(clockify, entry), end="")
+        else:
+            message = entry.get("message", "not updated.")
+
+            if writer is not None:
+                writer.write({"id": update["id"], "error": message})
+            else:
+                print("Time entry {}: {}".format(update["id"], message))
+
+    # Mirror updated time entries all at once
+    clockify.cache.create_many([(entry["id"], entry) for entry in updated])
+
+    if writer is not None:
+        writer.finish()
+        return
+
+    print()
+    print("{} of {} time entries updated.".format(len(updated), len(entries)))
+
+
+def operation_record(operation, status, result):
+    record = {
+        "key": operation["key"],
+        "action": operation["action"],
+        "status": status,
+        "id": None,
+        "error": None,
+    }
+
+    if status == outbox.APPLIED:
+        record["id"] = result["id"] if operation["action"] == "create" else result
     else:
-        print("Time entry not found.")
+        record["error"] = result
+
+        if operation["action"] == "delete":
+            record["id"] = operation["data"]["id"]
+
+    return record
+
+
+def flush_outbox(args, clockify):
+    # Send operations queued while Clockify couldn't be reached, now it can be
+    operations = outbox.pending()
+
+    if operations:
+        results = outbox.flush(clockify, operations)
+        sent = len([status for status, _ in results if status != outbox.PENDING])
+
+        notice(args, "{} of {} queued operations sent.".format(sent, len(results)))
+
+
+def sync_outbox(args, config, app_data):
+    clockify = app_data["clockify"]
+    operations = outbox.pending()
+
+    if not operations:
+        if structured(args):
+            render.write_records([], args.format, OPERATION_FIELDS)
+        else:
+            print("No queued operations.")
+        return
+
+    results = outbox.flush(clockify, operations, helpers.print_progress)
+
+    if structured(args):
+        render.write_records(
+            (
+                operation_record(operation, status, result)
+                for operation, (status, result) in zip(operations, results)
+            ),
+            args.format,
+            OPERATION_FIELDS,
+        )
+        return
+
+    for operation, (status, result) in zip(operations, results):
+        if status == outbox.APPLIED and operation["action"] == "create":
+            print(helpers.entry_bullet_point(clockify, result), end="")
+        elif status == outbox.APPLIED:
+            print("* Deleted time entry {}".format(result))
+        elif status == outbox.PENDING:
+            print("* Still queued ({}): {}".format(operation["action"], result))
+        else:
+            print("* Rejected ({}): {}".format(operation["action"], result))
+
+    sent = len([status for status, _ in results if status != outbox.PENDING])
+
+    print()
+    print("{} of {} queued operations sent.".format(sent, len(results)))
 
 
 def list_workspaces(args, config, app_data):
-    for workspace in app_data["clockify"].workspaces():
+    workspaces = app_data["clockify"].workspaces()
+
+    if structured(args):
+        render.write_records(workspaces, args.format)
+        return
+
+    for workspace in workspaces:
         print("* {} [{}]".format(workspace["name"], workspace["id"]))
 
 
 def list_projects(args, config, app_data):
-    project_names = []
-    project_data = {}
+    projects = sorted(
+        helpers.project_catalogue(app_data["clockify"]),
+        key=lambda project: project["name"],
+    )
 
-    for project in app_data["clockify"].projects(args.limit):
-        project_names.append(project["name"])
-        project_data[(project["name"])] = project
+    if args.limit:
+        projects = projects[: int(args.limit)]
 
-    project_names.sort()
-    for project in project_names:
-        print("* {} [{}]".format(project.encode("utf-8"), project_data[project]["id"]))
+    if structured(args):
+        render.write_records(projects, args.format)
+        return
+
+    for project in projects:
+        print("* {} [{}]".format(project["name"], project["id"]))
 
 
 def cache_statistics(args, config, app_data):
-    cache_dir = os.path.join(app_data["clockify"].cache.get_cache_directory())
+    if args.action == "warm":
+        task_count, failures = helpers.cache_workspace_tasks(
+            app_data["clockify"], refresh=True
+        )
+
+        if structured(args):
+            render.write_record(
+                {
+                    "action": "warm",
+                    "tasks": task_count,
+                    "failed": [project["id"] for project, _ in failures],
+                },
+                args.format,
+            )
+        else:
+            print("Cached {} tasks.".format(task_count))
+
+        if failures:
+            notice(
+                args,
+                "Couldn't cache the tasks of {} projects:".format(len(failures)),
+            )
+
+            for project, error in failures:
+                notice(
+                    args, "* {} [{}]: {}".format(project["name"], project["id"], error)
+                )
+        return
+
+    if args.action == "refresh":
+        app_data["clockify"].user(refresh=True)
+        helpers.project_catalogue(app_data["clockify"], refresh=True)
+
+        if structured(args):
+            render.write_record({"action": "refresh"}, args.format)
+        else:
+            print("Cached user profile and projects refreshed.")
+        return
 
-    cache_files = [
-        f for f in os.listdir(cache_dir) if os.path.isfile(os.path.join(cache_dir, f))
-    ]
+    counts = app_data["clockify"].cache.counts()
 
-    if len(cache_files):
-        print("Cached time entries: {}".format(str(len(cache_files))))
+    if structured(args):
+        render.write_records(
+            ({"kind": kind, "count": count} for kind, count in sorted(counts.items())),
+            args.format,
+            ["kind", "count"],
+        )
+
+        if "flush" in args and args.flush:
+            app_data["clockify"].cache.flush()
+        return
+
+    if counts:
+        for kind, count in sorted(counts.items()):
+            print("Cached {} items: {}".format(kind, count))
 
         if "flush" in args and args.flush:
             print("Cache flushed.")
-            shutil.rmtree(cache_dir)
+            app_data["clockify"].cache.flush()
     else:
         print("Cache is empty.")
 
 
 def project_details(args, config, app_data):
-    project_data = app_data["clockify"].get_project(args.id)
+    project_data = helpers.find_project(app_data["clockify"], args.id)
+
+    if project_data is None:
+        project_data = app_data["clockify"].get_project(args.id)
 
     if "message" in project_data:
-        print(project_data["message"])
+        notice(args, project_data["message"])
+        return
+
+    tasks = helpers.cached_project_tasks(app_data["clockify"], project_data["id"])
+
+    if structured(args):
+        render.write_record(dict(project_data, tasks=tasks), args.format)
         return
 
     print("Name: {}".format(project_data["name"]))
@@ -164,20 +622,17 @@ def project_details(args, config, app_data):
     print()
     print("Tasks:")
 
-    for project in app_data["clockify"].project_tasks(args.id):
-        print("* {} [{}]".format(project["name"].encode("utf-8"), project["id"]))
+    for task in tasks:
+        print("* {} [{}]".format(task["name"], task["id"]))
 
 
 def task_details(args, config, app_data):
-    task = app_data["clockify"].cache.get_cached_entry(args.id, "task")
-
-    # If task hasn't been cached, cache all project tasks
-    if task is None:
-        helpers.cache_workspace_tasks(app_data["clockify"])
-        task = app_data["clockify"].cache.get_cached_entry(args.id, "task")
+    task = helpers.find_task(app_data["clockify"], args.id)
 
     if task is None:
-        print("Task not found.")
+        notice(args, "Task not found.")
+    elif structured(args):
+        render.write_record(task, args.format)
     else:
         print("Name: {}".format(task["name"]))
         print("Project ID: {}".format(task["projectId"]))
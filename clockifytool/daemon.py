@@ -0,0 +1,229 @@
+"""Run commands in a long-running process to avoid startup costs.
+
+The daemon keeps the configuration, API client (and its pooled connections)
+and cache open between commands, listening on a Unix socket in a directory only
+the current user can access. When the daemon is running commands are forwarded
+to it and their output, and exit status, relayed back.
+
+Requests and responses are newline-delimited JSON: a request gives the command
+line arguments, and working directory, and the daemon responds with output, as
+it's written, followed by the exit status.
+"""
+
+import json
+import os
+import sys
+
+from clockifytool import __version__ as VERSION
+
+
+def socket_path():
+    from clockifytool import cache
+
+    # Commands, and their output, pass through the socket so it's kept where
+    # other users can't replace it
+    return os.path.join(cache.get_private_directory(), "daemon.sock")
+
+
+def connect():
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        client.connect(socket_path())
+    except OSError:
+        client.close()
+        return
+
+    return client
+
+
+def send(stream, message):
+    stream.write(json.dumps(message) + "\n")
+    stream.flush()
+
+
+def request(message):
+    # Send a request to the daemon, relaying its output, and return its exit
+    # status or None if the daemon isn't running or can't run the command
+    if not os.path.exists(socket_path()):
+        return
+
+    client = connect()
+
+    if client is None:
+        return
+
+    with client, client.makefile("rw", encoding="utf-8") as stream:
+        send(stream, dict(message, version=VERSION))
+
+        relayed = False
+
+        for line in stream:
+            response = json.loads(line)
+
+            if "exit" in response:
+                return response["exit"]
+
+            if "fallback" in response:
+                return
+
+            output = sys.stdout if response["stream"] == "stdout" else sys.stderr
+            output.write(response["data"])
+            output.flush()
+            relayed = True
+
+    # The daemon stopped part way through the command so it shouldn't be rerun
+    if relayed:
+        print("Daemon stopped unexpectedly.", file=sys.stderr)
+        return 1
+
+
+def forward(argv):
+    """Run a command using the daemon.
+    Returns:
+        int: Exit status or None if the daemon isn't running.
+    """
+    return request({"argv": list(argv), "cwd": os.getcwd()})
+
+
+def stop():
+    if request({"stop": True}) is None:
+        print("Daemon isn't running.")
+        return 1
+
+    print("Daemon stopped.")
+    return 0
+
+
+class ForwardedOutput(object):
+    """File-like object sending anything written to it to a daemon client."""
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.connected = True
+
+    def write(self, data):
+        # Keep running the command if the client goes away
+        if self.connected and data:
+            try:
+                send(self.stream, {"stream": self.name, "data": data})
+            except OSError:
+                self.connected = False
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def serve(run):
+    """Run commands, using the given function, as requested by clients.
+    Returns:
+        int: Exit status.
+    """
+    import socket
+
+    path = socket_path()
+
+    if os.path.exists(path):
+        client = connect()
+
+        if client is not None:
+            client.close()
+            print("Daemon is already running.")
+            return 1
+
+        # Remove socket left by a daemon that didn't shut down cleanly
+        os.remove(path)
+
+    # Only the current user can connect to the socket
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+
+    server.listen(8)
+    print("Daemon listening on {}.".format(path))
+
+    # API clients, by configuration, kept between commands
+    apis = {}
+
+    try:
+        # Commands are run one at a time as they share the process's output
+        while True:
+            connection, _ = server.accept()
+
+            try:
+                with connection, connection.makefile("rw", encoding="utf-8") as stream:
+                    if not handle(stream, run, apis):
+                        break
+            except OSError:
+                # The client went away before all of the output was sent
+                pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(path)
+
+    print("Daemon stopped.")
+    return 0
+
+
+def handle(stream, run, apis):
+    # Run a requested command, returning False if the daemon should stop
+    from contextlib import redirect_stderr, redirect_stdout
+
+    try:
+        message = json.loads(stream.readline())
+    except ValueError:
+        return True
+
+    if message.get("stop"):
+        send(stream, {"exit": 0})
+        return False
+
+    # Clients running a different version run commands themselves
+    if message.get("version") != VERSION:
+        send(stream, {"fallback": True})
+        return True
+
+    stdout = ForwardedOutput(stream, "stdout")
+    stderr = ForwardedOutput(stream, "stderr")
+    cwd = os.getcwd()
+
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            os.chdir(message["cwd"])
+            status = run(message["argv"], apis)
+        except SystemExit as e:
+            # Argument errors, and help, exit with a status code or message
+            if e.code is None or isinstance(e.code, int):
+                status = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                status = 1
+        except Exception:
+            import traceback
+
+            traceback.print_exc()
+            status = 1
+        finally:
+            os.chdir(cwd)
+
+    if stdout.connected:
+        try:
+            send(stream, {"exit": status})
+        except OSError:
+            pass
+
+    return True
@@ -1,123 +1,243 @@
 from __future__ import print_function, unicode_literals
 
-import calendar
-import collections
-from datetime import date, datetime, timedelta
-
-import dateutil.parser
-
-PERIODS = collections.OrderedDict()
-
-PERIODS["y"] = {"name": "yesterday", "description": "day before today"}
-PERIODS["dby"] = {"name": "daybeforeyesterday", "description": "day before yesterday"}
-PERIODS["lw"] = {"name": "lastweek", "description": "last work week (Monday to Friday)"}
-PERIODS["cw"] = {
-    "name": "currentweek",
-    "description": "current work week (Monday to Friday)",
-}
-PERIODS["flw"] = {
-    "name": "fulllastweek",
-    "description": "last full week (Sunday to Saturday)",
-}
-PERIODS["fcw"] = {
-    "name": "fullcurrentweek",
-    "description": "current full week (Sunday to Saturday)",
-}
-PERIODS["lm"] = {"name": "lastmonth", "description": "last month"}
-PERIODS["cm"] = {"name": "currentmonth", "description": "current month"}
-PERIODS["ly"] = {"name": "lastyear", "description": "last year"}
-PERIODS["cy"] = {"name": "currentyear", "description": "current year"}
-PERIODS["mon"] = {"name": "monday", "description": "Monday"}
-PERIODS["tue"] = {"name": "tuesday", "description": "Tuesday"}
-PERIODS["wed"] = {"name": "wednesday", "description": "Wednesday"}
-PERIODS["thu"] = {"name": "thursday", "description": "Thursday"}
-PERIODS["fri"] = {"name": "friday", "description": "Friday"}
-PERIODS["sat"] = {"name": "saturday", "description": "Saturday"}
-PERIODS["sun"] = {"name": "sunday", "description": "Sunday"}
-PERIODS["lmon"] = {"name": "lastmonday", "description": "Last Monday"}
-PERIODS["ltue"] = {"name": "lasttuesday", "description": "Last Tuesday"}
-PERIODS["lwed"] = {"name": "lastwednesday", "description": "Last Wednesday"}
-PERIODS["lthu"] = {"name": "lastthursday", "description": "Last Thursday"}
-PERIODS["lfri"] = {"name": "lastfriday", "description": "Last Friday"}
-PERIODS["lsat"] = {"name": "lastsaturday", "description": "Last Saturday"}
-PERIODS["lsun"] = {"name": "lastsunday", "description": "Last Sunday"}
-PERIODS["cp"] = {"name": "currentpayperiod", "description": "current pay period"}
-PERIODS["pp"] = {"name": "previouspayperiod", "description": "previous pay period"}
-
-
-# Artefactual's pay period details
-PERIOD_DAYS = 14
-PERIOD_FIRST_DAY = date(2019, 7, 6)  # Known first day of period.
-
-
-def time_entry_list(from_date, to_date, clockify, strict=False, verbose=False):
-    from_date_description = "{} ({})".format(
-        from_date, date_string_to_weekday_string(from_date)
+import sys
+from datetime import date, timedelta
+
+from clockifytool import instrumentation, mirror
+
+
+def time_entry_list(
+    from_date,
+    to_date,
+    clockify,
+    strict=False,
+    verbose=False,
+    offline=False,
+    output_format="text",
+    refresh=False,
+):
+    from clockifytool import render
+
+    renderer = render.create_renderer(output_format, clockify, verbose)
+    renderer.start(from_date, to_date)
+
+    # Get time entries, a page at a time, and write each entry once augmented
+    for time_entries in mirror.entry_pages(
+        clockify, from_date, to_date, strict, offline, refresh
+    ):
+        projects, tasks = entry_projects_and_tasks(clockify, time_entries, offline)
+
+        for entry in time_entries:
+            augment_entry(entry, projects, tasks)
+            renderer.entry(entry)
+
+    renderer.finish()
+
+
+def augment_entry(entry, projects, tasks):
+    # Add project and task names to a time entry
+    if entry["projectId"] in projects:
+        project = projects[entry["projectId"]]
+        entry["project"] = {"name": project["name"], "id": entry["projectId"]}
+
+    if entry["taskId"] in tasks:
+        task = tasks[entry["taskId"]]
+        entry["task"] = {"name": task["name"], "id": entry["taskId"]}
+
+
+def entry_projects_and_tasks(clockify, time_entries, offline=False):
+    projects = {}
+    tasks = {}
+    missing_projects = set()
+    missing_tasks = set()
+    stale_projects = set()
+    stale_tasks = set()
+
+    # Use cached projects and tasks where possible, noting which are missing and
+    # which have expired
+    for entry in time_entries:
+        project_id = entry["projectId"]
+        task_id = entry["taskId"]
+
+        if project_id is not None and project_id not in projects:
+            project, stale = clockify.cache.lookup(project_id, "project")
+
+            if project is None:
+                missing_projects.add(project_id)
+            else:
+                projects[project_id] = project
+
+                if stale:
+                    stale_projects.add(project_id)
+
+        if task_id is not None and task_id not in tasks:
+            task, stale = clockify.cache.lookup(task_id, "task")
+
+            if task is None:
+                missing_tasks.add((project_id, task_id))
+            else:
+                tasks[task_id] = task
+
+                if stale:
+                    stale_tasks.add((project_id, task_id))
+
+    # Offline, projects and tasks that haven't been cached are left out
+    if offline:
+        return projects, tasks
+
+    # Many missing projects take fewer requests to find in the paged project
+    # catalogue than to fetch one at a time
+    if len(missing_projects) > clockify.pool_size:
+        catalogue = {project["id"]: project for project in project_catalogue(clockify)}
+
+        for project_id in missing_projects & set(catalogue):
+            projects[project_id] = catalogue[project_id]
+
+        missing_projects -= set(catalogue)
+
+    # Fetch all missing projects and tasks at once
+    fetched_projects, fetched_tasks = fetch_projects_and_tasks(
+        clockify, missing_projects, missing_tasks
     )
-    to_date_description = "{} ({})".format(
-        to_date, date_string_to_weekday_string(to_date)
+    projects.update(fetched_projects)
+    tasks.update(fetched_tasks)
+
+    # Expired projects and tasks are used as is, then refreshed for next time
+    if stale_projects or stale_tasks:
+        clockify.run_in_background(
+            fetch_projects_and_tasks, clockify, stale_projects, stale_tasks
+        )
+
+    return projects, tasks
+
+
+def fetch_projects_and_tasks(clockify, project_ids, project_and_task_ids):
+    # Fetch, and cache, projects and tasks (given as project ID/task ID pairs),
+    # returning them by ID
+    project_ids = sorted(project_ids)
+    project_and_task_ids = sorted(project_and_task_ids)
+
+    calls = [(clockify.get_project, (project_id,)) for project_id in project_ids]
+    calls += [(clockify.get_task, task_ids) for task_ids in project_and_task_ids]
+
+    with instrumentation.phase("project and task lookups"):
+        results = run_concurrently(calls, clockify.pool_size)
+
+    # Leave out, rather than cache, error responses (if rate limited, for example)
+    projects = {
+        project_id: project
+        for project_id, project in zip(project_ids, results)
+        if is_named_object(project)
+    }
+    tasks = {
+        task_id: task
+        for (_, task_id), task in zip(project_and_task_ids, results[len(project_ids) :])
+        if is_named_object(task)
+    }
+
+    clockify.cache.create_many(projects.items(), "project")
+    clockify.cache.create_many(tasks.items(), "task")
+
+    return projects, tasks
+
+
+def is_named_object(data):
+    return isinstance(data, dict) and "id" in data and "name" in data
+
+
+def entries_by_id(clockify, entry_ids):
+    # Return time entries from the local mirror, looking for any that aren't
+    # there by listing the few days they were likely to have started in and,
+    # failing that, fetching them individually. The IDs of any that couldn't be
+    # found are also returned.
+    entries = {}
+
+    for entry_id in entry_ids:
+        entry = clockify.cache.get_cached_entry(entry_id, allow_stale=True)
+
+        if entry is not None:
+            entries[entry_id] = mirror.api_entry(entry)
+
+    missing_ids = [entry_id for entry_id in entry_ids if entry_id not in entries]
+    windows = mirror.merge_windows(
+        window
+        for window in map(mirror.creation_window, missing_ids)
+        if window is not None
     )
 
-    if from_date == to_date:
-        print("Fetching time entries from {}...".format(from_date_description))
-    else:
-        print(
-            "Fetching time entries from {} to {}...".format(
-                from_date_description, to_date_description
-            )
+    calls = [
+        (clockify.entries, (first_day + "T00:00:00", last_day + "T23:59:59"))
+        for first_day, last_day in windows
+    ]
+
+    wanted_ids = set(missing_ids)
+
+    for listed in run_concurrently(calls, clockify.pool_size):
+        entries.update(
+            (entry["id"], entry) for entry in listed if entry["id"] in wanted_ids
         )
-    print()
 
-    # Get yesterday's time entries
-    time_entries = clockify.entries(
-        start=from_date + "T00:00:00", end=to_date + "T23:59:59", strict=strict
+    missing_ids = [entry_id for entry_id in entry_ids if entry_id not in entries]
+    calls = [(clockify.get_entry, (entry_id,)) for entry_id in missing_ids]
+    fetched = [
+        entry
+        for entry in run_concurrently(calls, clockify.pool_size)
+        if isinstance(entry, dict) and "id" in entry
+    ]
+    clockify.cache.create_many([(entry["id"], entry) for entry in fetched])
+    entries.update((entry["id"], entry) for entry in fetched)
+
+    return (
+        [entries[entry_id] for entry_id in entry_ids if entry_id in entries],
+        [entry_id for entry_id in entry_ids if entry_id not in entries],
     )
 
-    # Augment data
-    for entry in time_entries:
-        if entry["projectId"] is not None:
-            project = clockify.cache.get_cached_entry(entry["projectId"])
 
-            if project is None:
-                project = clockify.get_project(entry["projectId"])
-                clockify.cache.create(project)
+def entries_in_range(clockify, from_date, to_date):
+    # Return time entries from a range of days, syncing the local mirror
+    return [
+        entry
+        for page in mirror.entry_pages(clockify, from_date, to_date)
+        for entry in page
+    ]
 
-            entry["project"] = {"name": project["name"], "id": entry["projectId"]}
 
-        if entry["taskId"] is not None:
-            task = clockify.cache.get_cached_entry(entry["taskId"])
+def run_concurrently(calls, max_workers, progress=None):
+    # Call each (function, arguments) pair using a bounded pool of worker threads,
+    # returning the results in the same order as the calls
+    if len(calls) < 2 or max_workers < 2:
+        results = []
 
-            if task is None:
-                task = clockify.get_task(entry["projectId"], entry["taskId"])
-                clockify.cache.create(task, task["id"], "task")
+        for function, arguments in calls:
+            results.append(function(*arguments))
 
-            entry["task"] = {"name": task["name"], "id": entry["taskId"]}
+            if progress is not None:
+                progress(len(results), len(calls))
 
-    if time_entries:
-        time_sum = 0
+        return results
 
-        # Print time entries
-        report = "Time entries:\n"
+    from concurrent.futures import ThreadPoolExecutor, as_completed
 
-        for entry in time_entries:
-            report += entry_bullet_point(clockify, entry, verbose)
-            time_sum += clockify.cache.iso_duration_to_hours(
-                entry["timeInterval"]["duration"]
-            )
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+        futures = [
+            executor.submit(function, *arguments) for function, arguments in calls
+        ]
 
-        report += "\n" + str(time_sum) + " hours.\n"
-    else:
-        report = "No time entries.\n"
+        if progress is not None:
+            for completed, _ in enumerate(as_completed(futures), 1):
+                progress(completed, len(calls))
 
-    print(report)
+        return [future.result() for future in futures]
 
 
 def entry_bullet_point(clockify, entry, verbose=False):
     item = "* "
 
     if verbose:
-        local_date_and_time = clockify.cache.utc_iso_8601_string_to_local_datatime_string(
-            entry["timeInterval"]["start"]
+        local_date_and_time = (
+            clockify.cache.utc_iso_8601_string_to_local_datatime_string(
+                entry["timeInterval"]["start"]
+            )
         )
         item += "{} - ".format(str(local_date_and_time))
 
@@ -177,207 +297,192 @@ def handle_hours_calculation_value(current_hours, new_value_or_calculation):
 
 
 def date_string_to_weekday_string(date_string):
+    import dateutil.parser
+
     return dateutil.parser.parse(date_string).strftime("%A")
 
 
-def weekday_of_week(day_of_week, weeks_previous=0):
-    days_ahead_of_weekday_last_week = (
-        date.today().weekday() + (weeks_previous * 7) - day_of_week
-    )
-    last_weekday = datetime.now() - timedelta(days=days_ahead_of_weekday_last_week)
-    return last_weekday.strftime("%Y-%m-%d")
+def resolve_project_template(project_name, templates):
+    if project_name in templates:
+        return templates[project_name]
 
 
-def weekday_last_week(day_of_week):
-    return weekday_of_week(day_of_week, 1)
+def template_field(issue_name, field, templates):
+    template = resolve_project_template(issue_name, templates)
+    if template and field in template:
+        return template[field]
 
 
-def resolve_period_abbreviation(period):
-    period = period.lower()
+def compile_aliases(templates):
+    # Resolve each alias, following aliases of aliases, to a project or task ID
+    aliases = {}
 
-    if period in PERIODS:
-        return PERIODS[period]["name"]
+    for alias in templates:
+        chain = [alias]
+        resolved_id = template_field(alias, "id", templates)
 
-    if period in {abbr: item.get("name") for abbr, item in PERIODS.items()}.values():
-        return period
+        while resolved_id:
+            if resolved_id in chain:
+                raise Exception(
+                    'Alias "{}" refers to itself: {}.'.format(
+                        alias, " -> ".join(str(name) for name in chain + [resolved_id])
+                    )
+                )
 
-    return None
+            chain.append(resolved_id)
+            resolved_id = template_field(resolved_id, "id", templates)
 
+        if len(chain) > 1:
+            aliases[str(alias)] = str(chain[-1])
 
-def resolve_period(period):
-    if period == "yesterday":
-        yesterday = handle_date_calculation_value("-1")
-        return {"start": yesterday, "end": yesterday}
+    return aliases
 
-    if period == "daybeforeyesterday":
-        yesterday = handle_date_calculation_value("-2")
-        return {"start": yesterday, "end": yesterday}
 
-    if period == "lastweek":
-        start_date = weekday_last_week(0)  # last Monday
-        end_date = weekday_last_week(4)  # last Friday
+def resolve_project_alias(issue_id, aliases):
+    return aliases.get(issue_id, issue_id)
 
-    if period == "currentweek":
-        start_date = weekday_of_week(0)  # this Monday
-        end_date = weekday_of_week(4)  # this Friday
 
-    if period == "fulllastweek":
-        start_date = weekday_of_week(6, 2)  # last Sunday
-        end_date = weekday_of_week(5, 1)  # last Saturday
+def cache_workspace_tasks(clockify, refresh=False):
+    """Cache the tasks of each project whose tasks haven't been cached.
+    Returns:
+        tuple: Number of tasks cached, and projects whose tasks couldn't be
+        fetched with the reason why.
+    """
+    cached_project_ids = set()
 
-    if period == "fullcurrentweek":
-        start_date = weekday_last_week(6)  # this Sunday
-        end_date = weekday_of_week(5)  # this Saturday
+    if not refresh:
+        cached_project_ids = clockify.cache.identifiers("project-tasks")
 
-    if period == "monday":
-        start_date = weekday_of_week(0)  # this Monday
-        end_date = start_date
+    projects = [
+        project
+        for project in project_catalogue(clockify, refresh)
+        if project["id"] not in cached_project_ids
+    ]
 
-    if period == "tuesday":
-        start_date = weekday_of_week(1)  # this Tuesday
-        end_date = start_date
+    if not projects:
+        return 0, []
 
-    if period == "wednesday":
-        start_date = weekday_of_week(2)  # this Wednesday
-        end_date = start_date
+    print("Caching project tasks...", file=sys.stderr)
 
-    if period == "thursday":
-        start_date = weekday_of_week(3)  # this Thursday
-        end_date = start_date
+    calls = [(fetch_project_tasks, (clockify, project["id"])) for project in projects]
 
-    if period == "friday":
-        start_date = weekday_of_week(4)  # this Friday
-        end_date = start_date
+    with instrumentation.phase("task warm-up"):
+        results = run_concurrently(calls, clockify.pool_size, print_progress)
 
-    if period == "saturday":
-        start_date = weekday_of_week(5)  # this Saturday
-        end_date = start_date
+    project_tasks_items = []
+    task_items = []
+    failures = []
 
-    if period == "sunday":
-        start_date = weekday_of_week(6)  # last Sunday
-        end_date = start_date
+    for project, (project_tasks, error) in zip(projects, results):
+        # Leave projects whose tasks couldn't be fetched to be retried later
+        if error is not None:
+            failures.append((project, error))
+            continue
 
-    if period == "lastmonday":
-        start_date = weekday_last_week(0)  # last Monday
-        end_date = start_date
+        project_tasks_items.append((project["id"], project_tasks))
+        task_items += [(task["id"], task) for task in project_tasks]
 
-    if period == "lasttuesday":
-        start_date = weekday_last_week(1)  # last Tuesday
-        end_date = start_date
+    # Cache all tasks, and each project's task list, in bulk
+    clockify.cache.create_many(task_items, "task")
+    clockify.cache.create_many(project_tasks_items, "project-tasks")
 
-    if period == "lastwednesday":
-        start_date = weekday_last_week(2)  # last Wednesday
-        end_date = start_date
+    return len(task_items), failures
 
-    if period == "lastthursday":
-        start_date = weekday_last_week(3)  # last Thursday
-        end_date = start_date
 
-    if period == "lastfriday":
-        start_date = weekday_last_week(4)  # last Friday
-        end_date = start_date
+def fetch_project_tasks(clockify, project_id):
+    # Return a project's tasks, or why they couldn't be fetched, so one project's
+    # failure doesn't stop the others' tasks being cached
+    import requests
 
-    if period == "lastsaturday":
-        start_date = weekday_last_week(5)  # last Saturday
-        end_date = start_date
+    from clockifytool.api import ClockifyApiError
 
-    if period == "lastsunday":
-        start_date = weekday_last_week(6)  # Sunday before last Sunday
-        end_date = start_date
+    try:
+        return clockify.project_tasks(project_id), None
+    except (requests.exceptions.RequestException, ClockifyApiError) as e:
+        return None, str(e)
 
-    today = date.today()
 
-    if period == "lastmonth":
-        first = today.replace(day=1)
-        last_month = first - timedelta(days=1)
-        last_year_and_month = last_month.strftime("%Y-%m")
+def cached_project_tasks(clockify, project_id):
+    project_tasks = clockify.cache.get_cached_entry(project_id, "project-tasks")
 
-        start_date = last_year_and_month + "-01"
-        end_date = last_year_and_month + "-" + str(last_month.day)
+    if project_tasks is None:
+        project_tasks = clockify.project_tasks(project_id)
 
-    if period == "currentmonth":
-        year_and_month = datetime.today().strftime("%Y-%m")
-        start_date = year_and_month + "-01"
+        clockify.cache.create(project_tasks, project_id, "project-tasks")
+        clockify.cache.create_many(
+            [(task["id"], task) for task in project_tasks], "task"
+        )
 
-        _, days_in_month = calendar.monthrange(today.year, today.month)
-        end_date = year_and_month + "-" + str(days_in_month)
+    return project_tasks
 
-    if period == "lastyear":
-        start_date = "{}-01-01".format(str(today.year - 1))
-        end_date = "{}-12-31".format(str(today.year - 1))
 
-    if period == "currentyear":
-        start_date = "{}-01-01".format(str(today.year))
-        end_date = "{}-12-31".format(str(today.year))
+def project_catalogue(clockify, refresh=False, allow_stale=False):
+    # Use the cached list of all projects in the workspace unless it's expired
+    # (each workspace's projects are cached separately)
+    projects = None
 
-    # Payroll periods
-    if period.endswith("payperiod"):
-        past_days = (today - PERIOD_FIRST_DAY).days % PERIOD_DAYS
+    if not refresh:
+        projects = clockify.cache.get_cached_entry(
+            clockify.workspace, "catalogue", allow_stale=allow_stale
+        )
 
-        if period == "currentpayperiod":
-            start_date = today - timedelta(days=past_days)
-            end_date = today + timedelta(days=PERIOD_DAYS - past_days - 1)
-        elif period == "previouspayperiod":
-            end_date = today - timedelta(days=past_days + 1)
-            start_date = end_date - timedelta(days=PERIOD_DAYS - 1)
+    if projects is None:
+        projects = clockify.all_projects()
 
-        return {
-            "start": start_date.strftime("%Y-%m-%d"),
-            "end": end_date.strftime("%Y-%m-%d"),
-        }
+        clockify.cache.create(projects, clockify.workspace, "catalogue")
+        clockify.cache.create_many(
+            [(project["id"], project) for project in projects], "project"
+        )
 
-    return {"start": start_date, "end": end_date}
+    return projects
 
 
-def resolve_project_template(project_name, templates):
-    if project_name in templates:
-        return templates[project_name]
+def find_project(clockify, id_or_name, allow_stale=False):
+    # Look up a project, by ID or (case-insensitive) name, in the project catalogue
+    name = id_or_name.lower()
 
+    for project in project_catalogue(clockify, allow_stale=allow_stale):
+        if project["id"] == id_or_name or project["name"].lower() == name:
+            return project
 
-def template_field(issue_name, field, templates):
-    template = resolve_project_template(issue_name, templates)
-    if template and field in template:
-        return template[field]
 
+def find_project_and_task(clockify, id_or_name, allow_stale=False):
+    # Resolve a project ID or name, or a task ID, to a project ID and task ID
+    project = find_project(clockify, id_or_name, allow_stale)
 
-def resolve_project_alias(issue_id, templates):
-    resolved_id = template_field(issue_id, "id", templates)
+    if project is not None:
+        return project["id"], None
 
-    if resolved_id:
-        return resolve_project_alias(resolved_id, templates)
-    else:
-        return issue_id
+    task = find_task(clockify, id_or_name)
 
+    if task is not None:
+        return task["projectId"], task["id"]
 
-def describe_periods():
-    description = "Available periods: "
-    first = True
+    return None, None
 
-    for abbreviation, period in PERIODS.items():
-        if not first:
-            description += ", "
 
-        description += '"{}" ("{}"): {}'.format(
-            period["name"], abbreviation, period["description"]
-        )
+def find_task(clockify, task_id):
+    # A task's project never changes so an expired cached task is still useful
+    task = clockify.cache.get_cached_entry(task_id, "task", allow_stale=True)
 
-        first = False
+    # Known project IDs aren't task IDs so there's no need to look further
+    if task is None and clockify.cache.get_cached_entry(
+        task_id, "project-tasks", allow_stale=True
+    ):
+        return
 
-    return description
+    # If task hasn't been cached, cache the tasks of any projects not yet cached
+    if task is None and cache_workspace_tasks(clockify)[0]:
+        task = clockify.cache.get_cached_entry(task_id, "task")
 
+    return task
 
-def cache_workspace_tasks(clockify):
-    print("Caching project tasks (this can take awhile)...")
 
-    # Cycle through each project in the workspace
-    for project in clockify.projects(limit=1000):
-        # Get cached project tasks (or get project tasks via API)
-        project_tasks = clockify.cache.get_cached_entry(project["id"], "project-tasks")
+def print_progress(completed, total):
+    # Progress goes to stderr so it doesn't mix with machine-readable output
+    sys.stderr.write("\r{}/{}".format(completed, total))
 
-        if project_tasks is None:
-            project_tasks = clockify.project_tasks(project["id"])
-            clockify.cache.create(project_tasks, project["id"], "project-tasks")
+    if completed == total:
+        sys.stderr.write("\n")
 
-        # Cache project's tasks
-        for task in project_tasks:
-            clockify.cache.create(task, task["id"], "task")
+    sys.stderr.flush()
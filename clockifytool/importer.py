@@ -0,0 +1,180 @@
+"""Create time entries in bulk from a CSV or YAML file.
+
+Each row describes a time entry using the same fields as the new command: "id"
+(project or task ID, name or alias), "comments", "hours", "date", "start" and
+"billable". Every row is validated before any time entry is created.
+"""
+
+import csv
+import os
+from datetime import date, datetime
+
+from clockifytool import helpers
+
+FIELDS = ["id", "comments", "hours", "date", "start", "billable"]
+
+# Fields of validated rows: the arguments time entries are created with
+ENTRY_FIELDS = [
+    "project",
+    "description",
+    "hours",
+    "date",
+    "start_time",
+    "billable",
+    "task",
+]
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path) as batch_file:
+        if extension in (".yml", ".yaml"):
+            import yaml
+
+            rows = yaml.safe_load(batch_file) or []
+        else:
+            rows = list(csv.DictReader(batch_file))
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise Exception("{} should contain a list of time entries.".format(path))
+
+    return rows
+
+
+def field(row, name):
+    value = row.get(name)
+
+    if value is None:
+        return
+
+    value = str(value).strip()
+
+    return value or None
+
+
+def is_billable(value):
+    return value is not None and value.lower() in ("1", "true", "yes", "y", "x")
+
+
+def validate_row(clockify, row, config):
+    # Return the arguments to create a time entry with, or raise RowError
+    templates = config.get("projects") or {}
+
+    # CSV cells beyond the header row's are read under None
+    if None in row:
+        raise RowError("Row has more values than the header.")
+
+    unknown = sorted(
+        str(name) for name in row if name is not None and name not in FIELDS
+    )
+
+    if unknown:
+        raise RowError("Unknown field(s): {}.".format(", ".join(unknown)))
+
+    id_or_alias = field(row, "id")
+
+    if id_or_alias is None:
+        raise RowError("Specify project or task ID.")
+
+    # Apply preset comments and/or hours, as the new command does
+    comments = field(row, "comments") or helpers.template_field(
+        id_or_alias, "comments", templates
+    )
+    hours = field(row, "hours") or helpers.template_field(
+        id_or_alias, "hours", templates
+    )
+
+    if not comments:
+        raise RowError("Specify comments.")
+
+    try:
+        hours = float(hours)
+    except (TypeError, ValueError):
+        raise RowError("Invalid hours value.")
+
+    if hours <= 0:
+        raise RowError("Hours value must be positive.")
+
+    project_id, task_id = helpers.find_project_and_task(
+        clockify, helpers.resolve_project_alias(id_or_alias, config["aliases"])
+    )
+
+    if project_id is None:
+        raise RowError('Project or task "{}" not found.'.format(id_or_alias))
+
+    entry_date = field(row, "date")
+    start = field(row, "start")
+
+    if entry_date is not None:
+        try:
+            entry_date = helpers.handle_date_calculation_value(entry_date)
+        except ValueError:
+            raise RowError("Invalid date.")
+
+        # Set start time to default if date's different than current
+        if entry_date != date.today().strftime("%Y-%m-%d") and start is None:
+            start = "08:00:00"
+
+    # Make sure the date and time can be converted before anything is submitted
+    try:
+        if entry_date is not None:
+            clockify.local_date_string_to_localized_datetime(
+                entry_date + " " + (start or "00:00")
+            )
+        elif start is not None:
+            # Today's start time is set on the current date/time, as when created
+            clockify.replace_datetime_time(datetime.now(), start)
+    except (ValueError, IndexError, OverflowError):
+        raise RowError("Invalid date or start time.")
+
+    return {
+        "project": project_id,
+        "description": comments,
+        "hours": hours,
+        "date": entry_date,
+        "start_time": start,
+        "billable": is_billable(field(row, "billable")),
+        "task": task_id,
+    }
+
+
+def validate_rows(clockify, rows, config):
+    # Return arguments for each valid row and the number, and error message, of
+    # each invalid one
+    entries = []
+    errors = []
+
+    for number, row in enumerate(rows, 1):
+        try:
+            entries.append(validate_row(clockify, row, config))
+        except RowError as e:
+            errors.append((number, str(e)))
+
+    return entries, errors
+
+
+def submit_entry(clockify, entry):
+    try:
+        return clockify.create_entry(**entry)
+    except Exception as e:
+        return {"message": str(e), "code": None}
+
+
+def submit_entries(clockify, entries):
+    # Create time entries concurrently, returning Clockify's response for each
+    calls = [(submit_entry, (clockify, entry)) for entry in entries]
+    results = helpers.run_concurrently(
+        calls, clockify.pool_size, helpers.print_progress
+    )
+
+    # Mirror created time entries so they're listed even if their days are settled
+    clockify.cache.create_many(
+        [(result["id"], result) for result in results if "id" in result]
+    )
+
+    return results
@@ -0,0 +1,219 @@
+"""Measure where a command spends its time.
+
+When enabled (by the --profile option) HTTP requests to Clockify, and reads and
+writes of the cache, are counted and timed, along with phases of a command such
+as loading the configuration. A breakdown is written to stderr once the command
+has finished. When not enabled, nothing is recorded.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in milliseconds, of latency histogram buckets
+LATENCY_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Path segments of Clockify API URLs that aren't IDs
+ENDPOINT_NAMES = {"workspaces", "projects", "tasks", "time-entries", "user"}
+
+enabled = False
+lock = threading.Lock()
+
+
+class Histogram(object):
+    """Count of durations falling in each latency bucket."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    def add(self, seconds):
+        milliseconds = seconds * 1000
+        index = 0
+
+        while index < len(LATENCY_BUCKETS) and milliseconds > LATENCY_BUCKETS[index]:
+            index += 1
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.slowest = max(self.slowest, seconds)
+
+    def percentile(self, fraction):
+        # Return the upper bound, in milliseconds, of the bucket a percentile is in
+        target = fraction * self.count
+        seen = 0
+
+        for index, count in enumerate(self.counts):
+            seen += count
+
+            if seen >= target and count:
+                if index < len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[index]
+
+                return self.slowest * 1000
+
+        return 0
+
+    def summary(self):
+        if not self.count:
+            return "no calls"
+
+        return (
+            "{} calls, {:.1f}ms total, {:.1f}ms mean, p50 <={}ms, p95 <={}ms, "
+            "max {:.1f}ms"
+        ).format(
+            self.count,
+            self.total * 1000,
+            self.total * 1000 / self.count,
+            format_bound(self.percentile(0.5)),
+            format_bound(self.percentile(0.95)),
+            self.slowest * 1000,
+        )
+
+
+def format_bound(milliseconds):
+    return "{:g}".format(round(milliseconds, 1))
+
+
+class Metrics(object):
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []
+        self.requests = {}
+        self.cache = {}
+
+    def add_phase(self, name, seconds):
+        with lock:
+            self.phases.append((name, seconds))
+
+    def add_request(self, method, url, status, sent, received, seconds):
+        with lock:
+            stats = self.requests.setdefault(
+                "{} {}".format(method, endpoint(url)),
+                {"statuses": {}, "sent": 0, "received": 0, "latency": Histogram()},
+            )
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            stats["sent"] += sent
+            stats["received"] += received
+            stats["latency"].add(seconds)
+
+    def add_cache_operation(self, operation, kind, seconds, outcome=None, items=1):
+        with lock:
+            stats = self.cache.setdefault(
+                (operation, kind), {"outcomes": {}, "items": 0, "latency": Histogram()}
+            )
+
+            if outcome is not None:
+                stats["outcomes"][outcome] = stats["outcomes"].get(outcome, 0) + 1
+
+            stats["items"] += items
+            stats["latency"].add(seconds)
+
+    def report(self):
+        lines = ["", "Profile:"]
+        lines.append(
+            "  total: {:.1f}ms".format((time.perf_counter() - self.started) * 1000)
+        )
+
+        lines.append("Phases:")
+
+        for name, seconds in self.phases:
+            lines.append("  {}: {:.1f}ms".format(name, seconds * 1000))
+
+        lines.append("HTTP requests:")
+
+        if not self.requests:
+            lines.append("  none")
+
+        for name, stats in sorted(self.requests.items()):
+            statuses = ", ".join(
+                "{} x{}".format(status, count)
+                for status, count in sorted(stats["statuses"].items(), key=str)
+            )
+            lines.append("  {}: {}".format(name, stats["latency"].summary()))
+            lines.append(
+                "    statuses: {}; {} bytes sent, {} bytes received".format(
+                    statuses, stats["sent"], stats["received"]
+                )
+            )
+
+        lines.append("Cache:")
+
+        if not self.cache:
+            lines.append("  none")
+
+        for (operation, kind), stats in sorted(self.cache.items()):
+            lines.append(
+                "  {} {}: {}".format(operation, kind, stats["latency"].summary())
+            )
+
+            outcomes = stats["outcomes"]
+
+            if outcomes:
+                hits = outcomes.get("hit", 0) + outcomes.get("stale", 0)
+                lines.append(
+                    "    {} hits ({} stale), {} misses, {:.0%} hit ratio".format(
+                        hits,
+                        outcomes.get("stale", 0),
+                        outcomes.get("miss", 0),
+                        hits / float(sum(outcomes.values())),
+                    )
+                )
+            elif stats["items"] != stats["latency"].count:
+                lines.append("    {} items".format(stats["items"]))
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def enable(started=None):
+    """Start recording, discarding anything recorded before."""
+    global enabled, metrics
+
+    metrics = Metrics(started)
+    enabled = True
+
+
+def disable():
+    global enabled
+
+    enabled = False
+
+
+def endpoint(url):
+    # Name an API endpoint by its path with IDs left out, so requests to the same
+    # endpoint are counted together
+    segments = re.sub(r"^[a-z]+://[^/]+", "", url.split("?")[0]).strip("/").split("/")
+    named = []
+
+    for index, segment in enumerate(segments):
+        if index and segments[index - 1] in ENDPOINT_NAMES:
+            if segment not in ENDPOINT_NAMES:
+                segment = "{id}"
+
+        # Leave out the API's base path
+        if named or segment in ENDPOINT_NAMES:
+            named.append(segment)
+
+    return "/".join(named)
+
+
+@contextmanager
+def phase(name):
+    """Time a phase of a command, if recording."""
+    if not enabled:
+        yield
+        return
+
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        metrics.add_phase(name, time.perf_counter() - started)
@@ -0,0 +1,200 @@
+"""Local mirror of the user's time entries.
+
+Time entries fetched from Clockify are cached, along with a record of which
+days have been synced and when. Days synced well after they ended are assumed
+not to change so later listings of them are answered from the mirror, with only
+recent or unsynced days being fetched from Clockify.
+
+Each workspace, and user, is mirrored separately so switching workspace or API
+key doesn't mix up their time entries.
+"""
+
+import re
+import time
+from datetime import date, datetime, timedelta
+
+# Days this recent are always refetched as their time entries may still change
+RECENT_DAYS = 7
+
+# Days before, and after, a time entry's creation that it's likely to start on
+CREATION_WINDOW_DAYS = (14, 1)
+
+
+def day_range(from_date, to_date):
+    day = date_from_string(from_date)
+    last_day = date_from_string(to_date)
+
+    while day <= last_day:
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
+
+
+def date_from_string(date_string):
+    return datetime.strptime(date_string[:10], "%Y-%m-%d").date()
+
+
+def day_settled(day, synced):
+    # A day's entries are settled if they were synced long enough after the day
+    settled_time = date_from_string(day) + timedelta(days=RECENT_DAYS)
+    return date.fromtimestamp(synced) >= settled_time
+
+
+def mirror_scope(clockify, offline=False):
+    # Return the workspace, and user, whose time entries are being mirrored
+    user = clockify.cached_user() if offline else clockify.user()
+
+    return clockify.workspace, user["id"] if user else None
+
+
+def in_scope(entry, scope):
+    return (entry.get("workspaceId"), entry.get("userId")) == scope
+
+
+def sync_key(scope, day):
+    return "{}-{}-{}".format(scope[0], scope[1], day)
+
+
+def day_runs(clockify, from_date, to_date, scope):
+    # Split a range of days into runs of consecutive days that either are, or
+    # aren't, settled in the mirror, returning them newest first
+    runs = []
+
+    for day in day_range(from_date, to_date):
+        sync = clockify.cache.get_cached_entry(sync_key(scope, day), "sync")
+        settled = sync is not None and day_settled(day, sync["synced"])
+
+        if runs and runs[-1][0] == settled:
+            runs[-1][2] = day
+        else:
+            runs.append([settled, day, day])
+
+    return list(reversed(runs))
+
+
+def utc_range(clockify, from_date, to_date):
+    # Convert a range of local days to UTC start and end date/times
+    return (
+        clockify.local_date_string_to_utc_iso_8601(from_date + "T00:00:00"),
+        clockify.local_date_string_to_utc_iso_8601(to_date + "T23:59:59"),
+    )
+
+
+def creation_window(entry_id):
+    # Time entry IDs are MongoDB object IDs, which begin with the time, in
+    # seconds since the epoch, they were created: return a range of days the
+    # time entry likely starts in
+    if not re.match(r"^[0-9a-f]{24}$", entry_id.lower()):
+        return
+
+    created = date.fromtimestamp(int(entry_id[:8], 16))
+
+    days_before, days_after = CREATION_WINDOW_DAYS
+
+    return (
+        (created - timedelta(days=days_before)).strftime("%Y-%m-%d"),
+        (created + timedelta(days=days_after)).strftime("%Y-%m-%d"),
+    )
+
+
+def merge_windows(windows):
+    # Combine overlapping, or adjacent, ranges of days
+    merged = []
+
+    for first_day, last_day in sorted(windows):
+        if merged:
+            day_after = date_from_string(merged[-1][1]) + timedelta(days=1)
+
+            if date_from_string(first_day) <= day_after:
+                merged[-1][1] = max(merged[-1][1], last_day)
+                continue
+
+        merged.append([first_day, last_day])
+
+    return [tuple(window) for window in merged]
+
+
+def mirrored_entries(clockify, from_date, to_date, scope):
+    start, end = utc_range(clockify, from_date, to_date)
+
+    return [
+        api_entry(entry)
+        for entry in clockify.cache.query(start, end)
+        if in_scope(entry, scope)
+    ]
+
+
+def api_entry(entry):
+    # Entries cached when created store project/task IDs differently than listings
+    if "projectId" not in entry:
+        entry = entry.copy()
+        entry["projectId"] = entry["project"]["id"] if entry.get("project") else None
+        entry["taskId"] = entry["task"]["id"] if entry.get("task") else None
+
+    return entry
+
+
+def entry_pages(
+    clockify, from_date, to_date, strict=False, offline=False, refresh=False
+):
+    # Yield pages of time entries, newest first, only fetching unsettled days
+    # unless every day is to be refreshed
+    scope = mirror_scope(clockify, offline)
+
+    if offline:
+        yield mirrored_entries(clockify, from_date, to_date, scope)
+        return
+
+    if refresh:
+        for page in sync_pages(clockify, from_date, to_date, scope, strict):
+            yield page
+        return
+
+    for settled, first_day, last_day in day_runs(clockify, from_date, to_date, scope):
+        if settled:
+            yield mirrored_entries(clockify, first_day, last_day, scope)
+        else:
+            for page in sync_pages(clockify, first_day, last_day, scope, strict):
+                yield page
+
+
+def sync_pages(clockify, from_date, to_date, scope, strict=False):
+    # Yield pages of time entries from Clockify, mirroring them as they arrive
+    synced = time.time()
+    entry_ids = set()
+
+    for page in clockify.entry_pages(
+        start=from_date + "T00:00:00", end=to_date + "T23:59:59", strict=strict
+    ):
+        entry_ids.update(entry["id"] for entry in page)
+
+        yield page
+
+    # Forget mirrored entries that have since been deleted
+    deleted_ids = [
+        entry["id"]
+        for entry in mirrored_entries(clockify, from_date, to_date, scope)
+        if entry["id"] not in entry_ids
+    ]
+    clockify.cache.delete_many(deleted_ids)
+
+    clockify.cache.create_many(
+        [
+            (sync_key(scope, day), {"synced": synced})
+            for day in day_range(from_date, to_date)
+        ],
+        "sync",
+    )
+
+
+def sync(clockify, from_date, to_date):
+    # Bring the mirror up to date for a range of days, returning the number of
+    # time entries fetched
+    entry_count = 0
+    scope = mirror_scope(clockify)
+
+    for settled, first_day, last_day in day_runs(clockify, from_date, to_date, scope):
+        if not settled:
+            for page in sync_pages(clockify, first_day, last_day, scope):
+                entry_count += len(page)
+
+    return entry_count
@@ -0,0 +1,296 @@
+"""Durable queue of time entry creations and deletions not yet sent to Clockify.
+
+Operations are journaled, in a file only the user can access, before they're
+sent so they aren't lost if Clockify can't be reached. Operations that couldn't
+be sent stay in the outbox, as pending, until they're sent by a later command or
+by "cft sync".
+
+Each operation has a key so it's applied at most once. Clockify doesn't accept
+idempotency keys itself, so before a creation is resent Clockify is checked for
+a matching time entry in case an earlier attempt succeeded without a response.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+FILENAME = "outbox.json"
+
+# Results of trying to apply an operation
+APPLIED = "applied"
+REJECTED = "rejected"
+PENDING = "pending"
+
+# Why deleting a time entry Clockify doesn't have was rejected
+NOT_FOUND = "Time entry not found."
+
+# Serialize changes to the outbox, and flushes of it, by threads of this process
+lock = threading.Lock()
+flush_lock = threading.Lock()
+
+
+def outbox_path():
+    from clockifytool import cache
+
+    # Operations are run with the user's API key so they mustn't be kept where
+    # other users could add to them
+    return os.path.join(cache.get_private_directory(), FILENAME)
+
+
+@contextmanager
+def file_lock(thread_lock, suffix):
+    # Hold a lock against other threads and, where supported, other processes
+    with thread_lock, open(outbox_path() + suffix, "a") as lock_file:
+        try:
+            import fcntl
+
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except ImportError:
+            pass
+
+        # Closing the lock file releases the lock
+        yield
+
+
+def locked():
+    # Lock the outbox against changes
+    return file_lock(lock, ".lock")
+
+
+def flushing():
+    # Lock against other flushes so each operation is only sent by one of them
+    return file_lock(flush_lock, ".flush-lock")
+
+
+def load():
+    try:
+        with open(outbox_path()) as outbox_file:
+            return json.load(outbox_file)
+    except (IOError, ValueError):
+        return []
+
+
+def save(operations):
+    path = outbox_path()
+    temporary_path = "{}.{}".format(path, os.getpid())
+
+    # Replace the outbox all at once so it's never left partly written
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    with os.fdopen(descriptor, "w") as outbox_file:
+        json.dump(operations, outbox_file)
+
+    os.replace(temporary_path, path)
+
+
+def pending():
+    with locked():
+        return load()
+
+
+def journal(action, items):
+    """Add an operation, for each item of data, to the outbox, returning them."""
+    import uuid
+
+    operations = [
+        {
+            "key": uuid.uuid4().hex,
+            "action": action,
+            "data": data,
+            "journaled": time.time(),
+            "attempts": 0,
+            "error": None,
+        }
+        for data in items
+    ]
+
+    with locked():
+        save(load() + operations)
+
+    return operations
+
+
+def record_results(operations, results):
+    # Remove operations that have been applied, or rejected by Clockify, and
+    # note attempts to apply the rest
+    finished = set()
+    attempted = {}
+
+    for operation, (status, result) in zip(operations, results):
+        if status == PENDING:
+            attempted[operation["key"]] = result
+        else:
+            finished.add(operation["key"])
+
+    with locked():
+        remaining = []
+
+        for operation in load():
+            if operation["key"] in finished:
+                continue
+
+            if operation["key"] in attempted:
+                operation["attempts"] += 1
+                operation["error"] = attempted[operation["key"]]
+
+            remaining.append(operation)
+
+        save(remaining)
+
+
+def transient(response):
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def response_message(response):
+    try:
+        return response.json().get("message", "HTTP {}".format(response.status_code))
+    except ValueError:
+        return "HTTP {}".format(response.status_code)
+
+
+def matching_entry(clockify, data):
+    # Return a time entry, if any, that an earlier attempt to create the time
+    # entry described by data created
+    from clockifytool.api import parse_utc_timestamp
+
+    start = clockify.utc_iso_8601_string_to_local_datatime_string(data["start"])
+    end = clockify.utc_iso_8601_string_to_local_datatime_string(data["end"])
+    started = parse_utc_timestamp(data["start"])
+
+    for entry in clockify.entries(start=start, end=end):
+        if (
+            entry["description"] == data["description"]
+            and entry.get("projectId") == data["projectId"]
+            and parse_utc_timestamp(entry["timeInterval"]["start"]) == started
+        ):
+            return entry
+
+
+def apply(clockify, operation):
+    """Try to apply an operation.
+    Returns:
+        tuple: Status (APPLIED, REJECTED or PENDING) and the created time entry,
+        the deleted time entry's ID, or an error message.
+    """
+    import requests
+
+    from clockifytool.api import ClockifyApiError
+
+    data = operation["data"]
+
+    try:
+        if operation["action"] == "create":
+            # An earlier attempt may have created the time entry
+            if operation["attempts"]:
+                entry = matching_entry(clockify, data)
+
+                if entry is not None:
+                    return APPLIED, entry
+
+            response = clockify.submit_entry(data)
+
+            if response.status_code in (200, 201):
+                return APPLIED, response.json()
+        else:
+            response = clockify.delete_entry(data["id"])
+
+            # A time entry that's gone may have been deleted by an earlier attempt
+            if response.status_code == 204 or (
+                response.status_code == 404 and operation["attempts"]
+            ):
+                return APPLIED, data["id"]
+
+            if response.status_code == 404:
+                return REJECTED, NOT_FOUND
+    except (requests.exceptions.RequestException, IOError, ClockifyApiError) as e:
+        # Including errors checking for an earlier attempt's time entry
+        return PENDING, str(e)
+
+    if transient(response):
+        return PENDING, response_message(response)
+
+    return REJECTED, response_message(response)
+
+
+def flush(clockify, operations=None, progress=None):
+    """Apply operations, by default every pending one, in concurrent batches.
+
+    Commands flush the outbox one at a time, and operations that another command
+    has already sent aren't sent again.
+    Returns:
+        list: Status, and result, of each operation.
+    """
+    from clockifytool import helpers
+
+    with flushing():
+        queued = pending()
+
+        if operations is None:
+            operations = queued
+
+        queued_keys = set(operation["key"] for operation in queued)
+        results = []
+
+        # Record results after each batch so an interrupted flush isn't repeated
+        for index in range(0, len(operations), clockify.pool_size):
+            batch = operations[index : index + clockify.pool_size]
+            calls = [
+                (
+                    apply if operation["key"] in queued_keys else sent_result,
+                    (clockify, operation),
+                )
+                for operation in batch
+            ]
+
+            batch_results = helpers.run_concurrently(calls, clockify.pool_size)
+            record_results(batch, batch_results)
+            mirror_results(clockify, batch, batch_results)
+
+            results += batch_results
+
+            if progress is not None:
+                progress(len(results), len(operations))
+
+    return results
+
+
+def sent_result(clockify, operation):
+    # Return the status, and result, of an operation another command has sent:
+    # the time entry it created is looked for, and a deleted one is gone
+    import requests
+
+    from clockifytool.api import ClockifyApiError
+
+    if operation["action"] == "delete":
+        return APPLIED, operation["data"]["id"]
+
+    try:
+        entry = matching_entry(clockify, operation["data"])
+    except (requests.exceptions.RequestException, IOError, ClockifyApiError) as e:
+        return REJECTED, "Sent by another command but not found: {}".format(e)
+
+    if entry is None:
+        return REJECTED, "Sent by another command but not created."
+
+    return APPLIED, entry
+
+
+def mirror_results(clockify, operations, results):
+    # Keep the local mirror of time entries up to date with applied operations,
+    # and forget time entries Clockify no longer has
+    created = []
+    deleted_ids = []
+
+    for operation, (status, result) in zip(operations, results):
+        if status == APPLIED and operation["action"] == "create":
+            created.append((result["id"], result))
+        elif status == APPLIED:
+            deleted_ids.append(result)
+        elif operation["action"] == "delete" and result == NOT_FOUND:
+            deleted_ids.append(operation["data"]["id"])
+
+    clockify.cache.create_many(created)
+    clockify.cache.delete_many(deleted_ids)
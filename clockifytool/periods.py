@@ -0,0 +1,261 @@
+"""Named time periods, such as "lastweek", and the days they cover.
+
+Each period is registered, once, with a function that returns the first and
+last day of the period given today's date. Periods can also be defined in the
+configuration file.
+"""
+
+import calendar
+import collections
+from datetime import date, datetime, timedelta
+
+# Periods, by abbreviation, in the order they're described
+PERIODS = collections.OrderedDict()
+
+# Abbreviations of periods by name and by abbreviation
+ABBREVIATIONS = {}
+
+# Artefactual's pay period details, unless configured otherwise
+PAY_PERIOD = {"days": 14, "first day": date(2019, 7, 6)}  # Known first day of period.
+
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def register(abbreviation, name, description, resolver):
+    PERIODS[abbreviation] = {
+        "name": name,
+        "description": description,
+        "resolve": resolver,
+    }
+    ABBREVIATIONS[abbreviation] = abbreviation
+    ABBREVIATIONS[name] = abbreviation
+
+
+def period(abbreviation, name, description):
+    # Decorator registering a function returning a period's first and last day
+    def decorator(resolver):
+        register(abbreviation, name, description, resolver)
+        return resolver
+
+    return decorator
+
+
+def weekday_of_week(today, day_of_week, weeks_previous=0):
+    return today - timedelta(days=today.weekday() + (weeks_previous * 7) - day_of_week)
+
+
+def weekday_resolver(day_of_week, weeks_previous=0):
+    def resolver(today):
+        day = weekday_of_week(today, day_of_week, weeks_previous)
+        return day, day
+
+    return resolver
+
+
+def recurring_period(today, first_day, days, offset=0):
+    # Return the first and last day of a recurring period of a number of days
+    past_days = (today - first_day).days % days
+    start_date = today - timedelta(days=past_days) + timedelta(days=offset * days)
+
+    return start_date, start_date + timedelta(days=days - 1)
+
+
+@period("y", "yesterday", "day before today")
+def yesterday(today):
+    day = today - timedelta(days=1)
+    return day, day
+
+
+@period("dby", "daybeforeyesterday", "day before yesterday")
+def day_before_yesterday(today):
+    day = today - timedelta(days=2)
+    return day, day
+
+
+@period("lw", "lastweek", "last work week (Monday to Friday)")
+def last_week(today):
+    return weekday_of_week(today, 0, 1), weekday_of_week(today, 4, 1)
+
+
+@period("cw", "currentweek", "current work week (Monday to Friday)")
+def current_week(today):
+    return weekday_of_week(today, 0), weekday_of_week(today, 4)
+
+
+@period("flw", "fulllastweek", "last full week (Sunday to Saturday)")
+def full_last_week(today):
+    return weekday_of_week(today, 6, 2), weekday_of_week(today, 5, 1)
+
+
+@period("fcw", "fullcurrentweek", "current full week (Sunday to Saturday)")
+def full_current_week(today):
+    return weekday_of_week(today, 6, 1), weekday_of_week(today, 5)
+
+
+@period("lm", "lastmonth", "last month")
+def last_month(today):
+    last_day = today.replace(day=1) - timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
+@period("cm", "currentmonth", "current month")
+def current_month(today):
+    _, days_in_month = calendar.monthrange(today.year, today.month)
+    return today.replace(day=1), today.replace(day=days_in_month)
+
+
+@period("ly", "lastyear", "last year")
+def last_year(today):
+    return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+
+
+@period("cy", "currentyear", "current year")
+def current_year(today):
+    return date(today.year, 1, 1), date(today.year, 12, 31)
+
+
+for day_of_week, weekday in enumerate(WEEKDAYS):
+    register(weekday[:3], weekday, weekday.capitalize(), weekday_resolver(day_of_week))
+
+for day_of_week, weekday in enumerate(WEEKDAYS):
+    register(
+        "l" + weekday[:3],
+        "last" + weekday,
+        "Last " + weekday.capitalize(),
+        weekday_resolver(day_of_week, 1),
+    )
+
+
+@period("cp", "currentpayperiod", "current pay period")
+def current_pay_period(today):
+    return recurring_period(today, PAY_PERIOD["first day"], PAY_PERIOD["days"])
+
+
+@period("pp", "previouspayperiod", "previous pay period")
+def previous_pay_period(today):
+    return recurring_period(today, PAY_PERIOD["first day"], PAY_PERIOD["days"], -1)
+
+
+def config_date(value, setting):
+    # Dates in the configuration file may be parsed by YAML already
+    if isinstance(value, date):
+        return value
+
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        raise Exception('Invalid date "{}" in {}.'.format(value, setting))
+
+
+def config_day(value, today, setting):
+    # Days can be dates or a number of days relative to today
+    if isinstance(value, int) or (isinstance(value, str) and value[:1] in ("+", "-")):
+        try:
+            return today + timedelta(days=int(value))
+        except ValueError:
+            raise Exception('Invalid day "{}" in {}.'.format(value, setting))
+
+    return config_date(value, setting)
+
+
+def configured_resolver(name, details):
+    setting = 'period "{}"'.format(name)
+
+    if "first day" in details:
+        # Recurring periods, like pay periods, are a number of days long
+        first_day = config_date(details["first day"], setting)
+        days = int(details.get("days", 14))
+        offset = int(details.get("offset", 0))
+
+        return lambda today: recurring_period(today, first_day, days, offset)
+
+    if "start" in details:
+        return lambda today: (
+            config_day(details["start"], today, setting),
+            config_day(details.get("end", details["start"]), today, setting),
+        )
+
+    raise Exception(
+        'Period "{}" needs either "first day" or "start" to be set.'.format(name)
+    )
+
+
+def configure(config):
+    """Apply the pay period details, and periods, set in the configuration."""
+    if "pay period" in config:
+        pay_period = config["pay period"]
+
+        if "first day" in pay_period:
+            PAY_PERIOD["first day"] = config_date(
+                pay_period["first day"], '"pay period"'
+            )
+
+        if "days" in pay_period:
+            PAY_PERIOD["days"] = int(pay_period["days"])
+
+    for name, details in (config.get("periods") or {}).items():
+        name = str(name).lower()
+        abbreviation = str(details.get("abbreviation", name)).lower()
+
+        register(
+            abbreviation,
+            name,
+            details.get("description", name),
+            configured_resolver(name, details),
+        )
+
+
+def resolve_abbreviation(period):
+    """Return the name of a period given its name or abbreviation."""
+    abbreviation = ABBREVIATIONS.get(period.lower())
+
+    if abbreviation is not None:
+        return PERIODS[abbreviation]["name"]
+
+
+def resolve(period, today=None):
+    """Return the first and last day, as strings, of a period given its name."""
+    abbreviation = ABBREVIATIONS.get(period)
+
+    if abbreviation is None:
+        return
+
+    if today is None:
+        today = date.today()
+
+    start_date, end_date = PERIODS[abbreviation]["resolve"](today)
+
+    return {
+        "start": start_date.strftime("%Y-%m-%d"),
+        "end": end_date.strftime("%Y-%m-%d"),
+    }
+
+
+def describe():
+    description = "Available periods: "
+    first = True
+
+    for abbreviation, period_details in PERIODS.items():
+        if not first:
+            description += ", "
+
+        if period_details["name"] == abbreviation:
+            description += '"{}": {}'.format(
+                abbreviation, period_details["description"]
+            )
+        else:
+            description += '"{}" ("{}"): {}'.format(
+                period_details["name"], abbreviation, period_details["description"]
+            )
+
+        first = False
+
+    return description
@@ -0,0 +1,74 @@
+"""Pace requests to Clockify so they stay within its rate limit.
+
+A token bucket is shared by every thread (and asyncio task) making requests
+with an API client. Tokens are added at the configured rate, up to a burst
+size, and each request takes one, waiting for it if need be. When Clockify
+responds that requests are being made too quickly, every request waits for as
+long as Clockify asks before the next one is made.
+"""
+
+import threading
+import time
+
+# Default requests per second: Clockify's documented limit per API key. Bursts
+# that still exceed it are paused, as Clockify asks, when they're refused
+DEFAULT_RATE = 50
+
+
+class TokenBucket(object):
+    def __init__(self, rate=DEFAULT_RATE, burst=None, clock=time.monotonic):
+        # Requests aren't paced, but are still paused, if there's no rate
+        self.rate = float(rate or 0)
+        self.burst = float(burst if burst is not None else max(self.rate, 1))
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.tokens = self.burst
+        self.updated = clock()
+        self.paused_until = 0
+
+    def reserve(self):
+        """Take a token, returning how long to wait, in seconds, before using it."""
+        with self.lock:
+            now = self.clock()
+
+            if not self.rate:
+                return max(0, self.paused_until - now)
+
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+
+            # Tokens can be borrowed from the future, making later requests wait
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+
+            return max(delay, self.paused_until - now)
+
+    def acquire(self):
+        delay = self.reserve()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        import asyncio
+
+        delay = self.reserve()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        # Hold back all requests, not just the one that was rate limited
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+def retry_after(response, attempt, backoff):
+    # Wait as long as Clockify asks, or back off exponentially
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return backoff * (2**attempt)
@@ -0,0 +1,237 @@
+"""Write time entries out, one at a time, in various formats.
+
+Renderers write each time entry as soon as it's given to them, keeping running
+totals, so listings of long periods start appearing immediately and don't have
+to be held in memory.
+"""
+
+import csv
+import json
+import sys
+
+from clockifytool import helpers
+
+# Output formats: "jsonl" is another name for "ndjson"
+FORMATS = ["text", "json", "ndjson", "jsonl", "csv", "tsv"]
+
+# Fields of the records written by the machine-readable formats
+RECORD_FIELDS = [
+    "id",
+    "start",
+    "hours",
+    "description",
+    "project_id",
+    "project",
+    "task_id",
+    "task",
+    "billable",
+]
+
+
+def create_renderer(output_format, clockify, verbose=False, output=None):
+    if output_format == "text":
+        return TextRenderer(clockify, verbose, output)
+
+    return RecordRenderer(clockify, verbose, output, output_format)
+
+
+def write_records(records, output_format, fields=None, output=None):
+    """Write records, as they're iterated over, in a machine-readable format."""
+    writer = RecordWriter(output_format, fields, output)
+    writer.start()
+
+    for record in records:
+        writer.write(record)
+
+    writer.finish()
+
+
+def write_record(record, output_format, output=None):
+    """Write a single record, in a machine-readable format."""
+    if output_format == "json":
+        output = output if output is not None else sys.stdout
+        output.write(json.dumps(record) + "\n")
+    else:
+        write_records([record], output_format, output=output)
+
+
+class RecordWriter(object):
+    """Write records (dicts) as JSON, newline-delimited JSON, CSV or TSV.
+
+    CSV and TSV have a header row of the given fields or, if none are given, the
+    fields of the first record. Any nested values are written as JSON.
+    """
+
+    def __init__(self, output_format, fields=None, output=None):
+        if output_format not in FORMATS or output_format == "text":
+            raise Exception('Unknown output format "{}".'.format(output_format))
+
+        self.output_format = output_format
+        self.fields = fields
+        self.output = output if output is not None else sys.stdout
+        self.writer = None
+        self.count = 0
+
+    def start(self):
+        if self.output_format == "json":
+            self.output.write("[")
+
+    def write(self, record):
+        if self.output_format == "json":
+            separator = ",\n" if self.count else "\n"
+            self.output.write(separator + json.dumps(record))
+        elif self.output_format in ("ndjson", "jsonl"):
+            self.output.write(json.dumps(record) + "\n")
+        else:
+            self.write_row(record)
+
+        self.count += 1
+        self.output.flush()
+
+    def write_row(self, record):
+        if self.writer is None:
+            self.start_table(self.fields or list(record))
+
+        self.writer.writerow(
+            {
+                field: json.dumps(value) if isinstance(value, (dict, list)) else value
+                for field, value in record.items()
+            }
+        )
+
+    def start_table(self, fields):
+        self.writer = csv.DictWriter(
+            self.output,
+            fields,
+            delimiter="\t" if self.output_format == "tsv" else ",",
+            lineterminator="\n",
+            extrasaction="ignore",
+        )
+        self.writer.writeheader()
+
+    def finish(self):
+        if self.output_format == "json":
+            self.output.write("\n]\n" if self.count else "]\n")
+        elif self.output_format in ("csv", "tsv") and self.writer is None:
+            # Write a header row, if fields are known, even if there are no records
+            if self.fields:
+                self.start_table(self.fields)
+
+        self.output.flush()
+
+
+def entry_hours(clockify, entry):
+    # Time entries that are still running have no duration yet
+    duration = entry["timeInterval"].get("duration")
+
+    if duration:
+        return clockify.cache.iso_duration_to_hours(duration)
+
+
+def entry_record(clockify, entry):
+    # Flatten a time entry, and its project and task names, into a record
+    project = entry.get("project") or {}
+    task = entry.get("task") or {}
+
+    return {
+        "id": entry["id"],
+        "start": clockify.cache.utc_iso_8601_string_to_local_datatime_string(
+            entry["timeInterval"]["start"]
+        ),
+        "hours": entry_hours(clockify, entry),
+        "description": entry["description"],
+        "project_id": entry.get("projectId"),
+        "project": project.get("name"),
+        "task_id": entry.get("taskId"),
+        "task": task.get("name"),
+        "billable": bool(entry["billable"]),
+    }
+
+
+class EntryRenderer(object):
+    """Write time entries as they're given, keeping count of them and their hours.
+
+    By default each time entry is written as a bullet point, without a heading
+    or totals.
+    """
+
+    def __init__(self, clockify, verbose=False, output=None):
+        self.clockify = clockify
+        self.verbose = verbose
+        self.output = output if output is not None else sys.stdout
+
+        self.count = 0
+        self.hours = 0
+
+    def start(self, from_date, to_date):
+        pass
+
+    def entry(self, entry):
+        self.count += 1
+        self.hours += entry_hours(self.clockify, entry) or 0
+
+        self.write_entry(entry)
+        self.output.flush()
+
+    def write_entry(self, entry):
+        self.output.write(
+            helpers.entry_bullet_point(self.clockify, entry, self.verbose)
+        )
+
+    def finish(self):
+        pass
+
+
+class TextRenderer(EntryRenderer):
+    def start(self, from_date, to_date):
+        from_date_description = "{} ({})".format(
+            from_date, helpers.date_string_to_weekday_string(from_date)
+        )
+        to_date_description = "{} ({})".format(
+            to_date, helpers.date_string_to_weekday_string(to_date)
+        )
+
+        if from_date == to_date:
+            self.write(
+                "Fetching time entries from {}...\n".format(from_date_description)
+            )
+        else:
+            self.write(
+                "Fetching time entries from {} to {}...\n".format(
+                    from_date_description, to_date_description
+                )
+            )
+
+        self.write("\n")
+        self.output.flush()
+
+    def write(self, text):
+        self.output.write(text)
+
+    def write_entry(self, entry):
+        if self.count == 1:
+            self.write("Time entries:\n")
+
+        super(TextRenderer, self).write_entry(entry)
+
+    def finish(self):
+        if self.count:
+            self.write("\n" + str(self.hours) + " hours.\n\n")
+        else:
+            self.write("No time entries.\n\n")
+
+
+class RecordRenderer(EntryRenderer):
+    def __init__(self, clockify, verbose=False, output=None, output_format="ndjson"):
+        super(RecordRenderer, self).__init__(clockify, verbose, output)
+
+        self.writer = RecordWriter(output_format, RECORD_FIELDS, self.output)
+
+    def start(self, from_date, to_date):
+        self.writer.start()
+
+    def write_entry(self, entry):
+        self.writer.write(entry_record(self.clockify, entry))
+
+    def finish(self):
+        self.writer.finish()
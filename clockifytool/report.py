@@ -0,0 +1,260 @@
+"""Aggregate time entries into totals for reports.
+
+Time entries are loaded into columns (arrays of start days, durations and
+interned project and task IDs) so totals can be grouped by any combination of
+project, task, day, week and billable status in a single pass over the columns.
+"""
+
+import collections
+from array import array
+from datetime import date, timedelta
+
+from clockifytool import helpers, mirror
+
+# Ways totals can be grouped, in the order they're nested when combined
+GROUPINGS = ["project", "task", "day", "week", "billable"]
+
+# Index stored for time entries without a project or task
+NONE_INDEX = -1
+
+
+class EntryColumns(object):
+    """Time entries stored column by column, one row per entry."""
+
+    def __init__(self):
+        self.duration = array("l")  # Duration in seconds
+        self.day = array("l")  # Local date the entry started, as an ordinal
+        self.project = array("l")  # Index into project_ids
+        self.task = array("l")  # Index into task_ids
+        self.billable = array("b")
+
+        self.project_ids = []
+        self.task_ids = []
+        self.interned = {"project": {}, "task": {}}
+
+    def __len__(self):
+        return len(self.duration)
+
+    def intern(self, kind, identifier, identifiers):
+        if identifier is None:
+            return NONE_INDEX
+
+        indexes = self.interned[kind]
+
+        if identifier not in indexes:
+            indexes[identifier] = len(identifiers)
+            identifiers.append(identifier)
+
+        return indexes[identifier]
+
+    def append(self, clockify, entry):
+        # Entries that are still running have no duration yet
+        if not entry["timeInterval"].get("duration"):
+            return
+
+        started = clockify.cache.utc_iso_8601_string_to_local_datetime(
+            entry["timeInterval"]["start"]
+        )
+        hours = clockify.cache.iso_duration_to_hours(entry["timeInterval"]["duration"])
+
+        self.duration.append(int(round(hours * 3600)))
+        self.day.append(started.date().toordinal())
+        self.project.append(
+            self.intern("project", entry["projectId"], self.project_ids)
+        )
+        self.task.append(self.intern("task", entry["taskId"], self.task_ids))
+        self.billable.append(1 if entry["billable"] else 0)
+
+    def extend(self, clockify, entries):
+        for entry in entries:
+            self.append(clockify, entry)
+
+    def key_column(self, grouping):
+        if grouping == "week":
+            # Weeks are identified by the ordinal of their Monday
+            return (day - date.fromordinal(day).weekday() for day in self.day)
+
+        return getattr(self, grouping)
+
+    def totals(self, groupings):
+        # Sum durations, in seconds, grouped by the given columns
+        totals = collections.defaultdict(int)
+
+        if len(groupings) == 1:
+            keys = self.key_column(groupings[0])
+        else:
+            keys = zip(*[self.key_column(grouping) for grouping in groupings])
+
+        for key, duration in zip(keys, self.duration):
+            totals[key] += duration
+
+        return totals
+
+
+def load_entries(clockify, from_date, to_date, offline=False, refresh=False):
+    # Load time entries into columns, along with the projects and tasks they
+    # belong to
+    columns = EntryColumns()
+    projects = {}
+    tasks = {}
+
+    for time_entries in mirror.entry_pages(
+        clockify, from_date, to_date, offline=offline, refresh=refresh
+    ):
+        columns.extend(clockify, time_entries)
+
+        page_projects, page_tasks = helpers.entry_projects_and_tasks(
+            clockify, time_entries, offline
+        )
+        projects.update(page_projects)
+        tasks.update(page_tasks)
+
+    return columns, projects, tasks
+
+
+def group_label(columns, grouping, value, projects, tasks):
+    if grouping == "billable":
+        return "billable" if value else "unbillable"
+
+    if grouping == "day":
+        day = date.fromordinal(value)
+        return "{} ({})".format(day.strftime("%Y-%m-%d"), day.strftime("%A"))
+
+    if grouping == "week":
+        monday = date.fromordinal(value)
+        return "week of {} to {}".format(
+            monday.strftime("%Y-%m-%d"),
+            (monday + timedelta(days=6)).strftime("%Y-%m-%d"),
+        )
+
+    if value == NONE_INDEX:
+        return "no {}".format(grouping)
+
+    if grouping == "project":
+        identifier = columns.project_ids[value]
+        named = projects.get(identifier)
+    else:
+        identifier = columns.task_ids[value]
+        named = tasks.get(identifier)
+
+    if named is not None and "name" in named:
+        return "{}: {}".format(named["name"], identifier)
+
+    return identifier
+
+
+def report_rows(columns, groupings, projects, tasks):
+    # Return (labels, hours) pairs, ordered by label within each grouping
+    totals = columns.totals(groupings)
+    rows = []
+
+    for key, seconds in totals.items():
+        values = key if len(groupings) > 1 else (key,)
+        labels = [
+            group_label(columns, grouping, value, projects, tasks)
+            for grouping, value in zip(groupings, values)
+        ]
+        rows.append((labels, seconds / 3600.0))
+
+    # Dates and weeks sort chronologically, as their labels begin with the date
+    rows.sort(key=lambda row: [label.lower() for label in row[0]])
+
+    return rows
+
+
+def group_fields(columns, grouping, value, projects, tasks):
+    # Return a grouping's value as record fields rather than as a label
+    if grouping == "billable":
+        return {"billable": bool(value)}
+
+    if grouping in ("day", "week"):
+        return {grouping: date.fromordinal(value).strftime("%Y-%m-%d")}
+
+    if value == NONE_INDEX:
+        return {grouping + "_id": None, grouping: None}
+
+    if grouping == "project":
+        identifier = columns.project_ids[value]
+        named = projects.get(identifier) or {}
+    else:
+        identifier = columns.task_ids[value]
+        named = tasks.get(identifier) or {}
+
+    return {grouping + "_id": identifier, grouping: named.get("name")}
+
+
+def report_records(columns, groupings, projects, tasks):
+    # Return a record, with a field, or fields, per grouping, for each total
+    records = []
+
+    for key, seconds in columns.totals(groupings).items():
+        values = key if len(groupings) > 1 else (key,)
+        record = {}
+
+        for grouping, value in zip(groupings, values):
+            record.update(group_fields(columns, grouping, value, projects, tasks))
+
+        record["hours"] = seconds / 3600.0
+        records.append(record)
+
+    records.sort(key=lambda record: [str(value) for value in record.values()])
+
+    return records
+
+
+def record_fields(groupings):
+    fields = []
+
+    for grouping in groupings:
+        if grouping in ("project", "task"):
+            fields.append(grouping + "_id")
+
+        fields.append(grouping)
+
+    return fields + ["hours"]
+
+
+def print_report(
+    clockify,
+    from_date,
+    to_date,
+    groupings,
+    offline=False,
+    output_format="text",
+    refresh=False,
+):
+    if output_format != "text":
+        from clockifytool import render
+
+        columns, projects, tasks = load_entries(
+            clockify, from_date, to_date, offline, refresh
+        )
+        render.write_records(
+            report_records(columns, groupings, projects, tasks),
+            output_format,
+            record_fields(groupings),
+        )
+        return
+
+    print(
+        "Reporting time entries from {} to {} by {}...".format(
+            from_date, to_date, ", ".join(groupings)
+        )
+    )
+    print()
+
+    columns, projects, tasks = load_entries(
+        clockify, from_date, to_date, offline, refresh
+    )
+
+    if not len(columns):
+        print("No time entries.\n")
+        return
+
+    for labels, hours in report_rows(columns, groupings, projects, tasks):
+        print("* {}: {} hours".format(" / ".join(labels), round(hours, 2)))
+
+    total_hours = sum(columns.duration) / 3600.0
+    print(
+        "\n{} hours in {} time entries.\n".format(round(total_hours, 2), len(columns))
+    )
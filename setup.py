@@ -22,5 +22,6 @@ setup(
     url="https://github.com/artefactual-labs/clockify-tool",
     keywords=["clockify"],
     install_requires=requirements,
+    extras_require={"async": ["aiohttp"]},
     scripts=["bin/cft"],
 )